@@ -0,0 +1,55 @@
+"""
+Measures the overhead per call of the instrumentation decorators in src/decorators.py, with their log level disabled
+(the production case) and enabled (logged to a NullHandler).
+
+    python -m benchmarks.decorators
+"""
+import argparse
+import logging
+import timeit
+
+from src.custom_logging import TRACE
+from src.decorators import log_args, timeit as timeit_decorator
+
+
+class Instrumented:
+    def __init__(self):
+        self.log = logging.getLogger('benchmarks.decorators')
+
+    def bare(self, duns, blockIDs, fields=None):
+        return duns
+
+    @log_args
+    def with_log_args(self, duns, blockIDs, fields=None):
+        return duns
+
+    @timeit_decorator
+    def with_timeit(self, duns, blockIDs, fields=None):
+        return duns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=200000)
+    args = parser.parse_args()
+
+    instance = Instrumented()
+    instance.log.handlers = [logging.NullHandler()]
+    instance.log.propagate = False
+    call_args = ('804735132', 'companyinfo_L2_v1,principalscontacts_L1_v2')
+    call_kwargs = {'fields': ['organization.primaryName', 'organization.countryISOAlpha2Code']}
+
+    for level_name, level in (('WARNING', logging.WARNING), ('TRACE', TRACE)):
+        instance.log.setLevel(level)
+        print(f"Logger level {level_name}")
+        baseline = None
+        for name in ('bare', 'with_log_args', 'with_timeit'):
+            method = getattr(instance, name)
+            seconds = min(timeit.repeat(lambda: method(*call_args, **call_kwargs), number=args.number, repeat=5))
+            nanoseconds = seconds / args.number * 1e9
+            baseline = baseline if baseline is not None else nanoseconds
+            print(f"  {name:14} {nanoseconds:8.0f} ns/call  overhead {nanoseconds - baseline:8.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Compares the HTTP/1.1 connection pool with the HTTP/2 transport (src/http2_transport.py) on a high fan-out workload.
+
+Two local stub servers answer every request with a dataBlocks-sized JSON body after a fixed delay: one speaks
+HTTP/1.1, the other HTTP/2 with prior knowledge (h2c). The benchmark reports the wall time and the number of
+connections each server accepted. Requires httpx[http2].
+
+    python -m benchmarks.http2_transport --requests 400 --workers 64 --delay 0.05
+"""
+import argparse
+import asyncio
+import http.server
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from src.http2_transport import Http2Adapter
+from src.session import KeepAliveAdapter
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+except ImportError:
+    h2 = None
+
+BODY = json.dumps({'organization': {'duns': '804735132', 'padding': 'x' * 20000}}).encode('utf-8')
+
+
+class Http1Stub:
+    def __init__(self, delay: float):
+        self.connections = 0
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                stub.connections += 1
+                super().setup()
+
+            def do_GET(self):
+                time.sleep(delay)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(BODY)))
+                self.end_headers()
+                self.wfile.write(BODY)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+class Http2Stub:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.connections = 0
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), daemon=True).start()
+        ready.wait()
+        self.url = f'http://127.0.0.1:{self.port}/'
+
+    def _run(self, ready: threading.Event) -> None:
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(asyncio.start_server(self._serve, '127.0.0.1', 0))
+        self.port = server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_forever()
+
+    async def _respond(self, connection, writer, stream_id: int) -> None:
+        await asyncio.sleep(self.delay)
+        connection.send_headers(stream_id, [
+            (':status', '200'), ('content-type', 'application/json'), ('content-length', str(len(BODY))),
+        ])
+        offset = 0
+        while offset < len(BODY):
+            # Respect the flow control window; wait for WINDOW_UPDATE frames if it is exhausted.
+            window = min(connection.local_flow_control_window(stream_id), connection.max_outbound_frame_size)
+            if window <= 0:
+                await asyncio.sleep(0.001)
+                continue
+            chunk = BODY[offset:offset + window]
+            offset += len(chunk)
+            connection.send_data(stream_id, chunk, end_stream=offset >= len(BODY))
+            writer.write(connection.data_to_send())
+        await writer.drain()
+
+    async def _serve(self, reader, writer) -> None:
+        self.connections += 1
+        connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        writer.write(connection.data_to_send())
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            for event in connection.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    asyncio.ensure_future(self._respond(connection, writer, event.stream_id))
+            writer.write(connection.data_to_send())
+        writer.close()
+
+
+def run(session: requests.Session, url: str, total: int, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for response in executor.map(lambda _: session.get(url, timeout=(5, 30)), range(total)):
+            assert len(response.content) == len(BODY)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--delay', type=float, default=0.05, help='Server latency per request in seconds.')
+    args = parser.parse_args()
+
+    if h2 is None or not Http2Adapter.available():
+        raise SystemExit("This benchmark requires httpx[http2]: pip install 'httpx[http2]'")
+    # Frame-level debug logging of the HTTP/2 stack would dominate the measurement.
+    for name in ('hpack', 'h2', 'httpcore', 'httpx'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    http1 = Http1Stub(args.delay)
+    session = requests.Session()
+    session.mount('http://', KeepAliveAdapter(pool_maxsize=args.workers))
+    seconds = run(session, http1.url, args.requests, args.workers)
+    print(f"HTTP/1.1 {seconds:7.3f} s  {args.requests / seconds:8.1f} req/s  {http1.connections:4} connections")
+
+    http2 = Http2Stub(args.delay)
+    session = requests.Session()
+    session.mount('http://', Http2Adapter(max_connections=4, prior_knowledge=True))
+    seconds = run(session, http2.url, args.requests, args.workers)
+    print(f"HTTP/2   {seconds:7.3f} s  {args.requests / seconds:8.1f} req/s  {http2.connections:4} connections")
+
+
+if __name__ == '__main__':
+    main()
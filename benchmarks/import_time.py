@@ -0,0 +1,44 @@
+"""
+Measures the cold start of the package: the wall time of a fresh interpreter that only imports a module, as paid by
+every short-lived worker process. The interpreter start itself is measured separately and subtracted.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --modules src src.direct_plus --runs 30
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def cold_start(statement: str, runs: int) -> float:
+    """
+    Returns the median wall time in seconds of running statement in a fresh interpreter.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=PROJECT_ROOT, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=['src', 'src.transformer.parallel', 'src.direct_plus'])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    interpreter = cold_start('pass', args.runs)
+    print(f"{'interpreter':28} {interpreter * 1000:7.1f} ms")
+    for module in args.modules:
+        seconds = cold_start(f'import {module}', args.runs) - interpreter
+        print(f"{'import ' + module:28} {seconds * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
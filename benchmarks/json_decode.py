@@ -0,0 +1,88 @@
+"""
+Benchmarks the JSON backends in src/json_backend.py on dataBlocks-sized payloads.
+
+Pass saved dataBlocks responses to measure real payloads, otherwise synthetic payloads of typical sizes are generated:
+
+    python -m benchmarks.json_decode
+    python -m benchmarks.json_decode response1.json response2.json
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import timeit
+from pathlib import Path
+
+from src import json_backend
+
+
+def _text(length: int) -> str:
+    return ''.join(random.choices(string.ascii_letters + ' ', k=length))
+
+
+def synthetic_payload(members: int) -> bytes:
+    """
+    Returns a dataBlocks-like response. The size grows with the number of principals, industry codes and financials,
+    which is what makes real responses large.
+    """
+    organization = {
+        'duns': '804735132',
+        'primaryName': _text(30),
+        'countryISOAlpha2Code': 'US',
+        'primaryAddress': {
+            'streetAddress': {'line1': _text(30), 'line2': None},
+            'addressLocality': {'name': _text(12)},
+            'postalCode': '10001',
+            'latitude': 40.75,
+            'longitude': -73.99,
+        },
+        'industryCodes': [
+            {'code': str(random.randint(1000, 9999)), 'description': _text(40), 'typeDnBCode': 3599, 'priority': i}
+            for i in range(members)
+        ],
+        'currentPrincipals': [
+            {'fullName': _text(20), 'jobTitles': [{'title': _text(15)}], 'isMostSenior': i == 0}
+            for i in range(members)
+        ],
+        'financials': [
+            {
+                'financialStatementToDate': '2023-12-31',
+                'overview': {key: random.random() * 1e6 for key in ('salesRevenue', 'netIncome', 'totalAssets')},
+            }
+            for _ in range(members)
+        ],
+    }
+    response = {
+        'transactionDetail': {'transactionID': _text(20), 'transactionTimestamp': '2024-01-01T00:00:00.000Z'},
+        'inquiryDetail': {'duns': '804735132', 'blockIDs': ['companyinfo_L2_v1', 'principalscontacts_L1_v2']},
+        'blockStatus': [{'blockID': 'companyinfo_L2_v1', 'status': 'ok'}],
+        'organization': organization,
+    }
+    return json.dumps(response).encode('utf-8')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', help='Saved dataBlocks responses.')
+    parser.add_argument('--number', type=int, default=50, help='Decodes per measurement.')
+    args = parser.parse_args()
+
+    random.seed(0)
+    if args.files:
+        payloads = {Path(file).name: Path(file).read_bytes() for file in args.files}
+    else:
+        payloads = {f'synthetic {members} members': synthetic_payload(members) for members in (10, 100, 1000)}
+
+    print(f"Selected backend: {json_backend.BACKEND}", file=sys.stderr)
+    for name, payload in payloads.items():
+        print(f"{name} ({len(payload) / 1024:.0f} KiB)")
+        baseline = None
+        for backend, loads in json_backend.BACKENDS.items():
+            seconds = min(timeit.repeat(lambda: loads(payload), number=args.number, repeat=5)) / args.number
+            baseline = baseline or seconds
+            print(f"  {backend:8} {seconds * 1000:8.3f} ms  {seconds / baseline:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
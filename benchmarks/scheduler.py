@@ -0,0 +1,84 @@
+"""
+Interactive latency under a bulk load. A bulk job enriches duns numbers from many threads while one thread makes
+interactive lookups through the same session, first without and then with a RequestScheduler (see src/scheduler.py).
+Reports the latency of the interactive lookups and the throughput of the bulk job.
+
+    python -m benchmarks.scheduler
+    python -m benchmarks.scheduler --bulk-workers 32 --max-concurrency 8 --reserved 2 --latency 0.05
+"""
+import argparse
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from benchmarks.stub_server import StubServer
+from src.direct_plus import DirectPlus
+from src.scheduler import BULK, INTERACTIVE, request_context
+
+BLOCK_IDS = 'companyinfo_L2_v1'
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def run(stub: StubServer, args, scheduler_options: dict = None) -> None:
+    session_options = {'base_url': stub.url, 'cache': False, 'pool_maxsize': args.bulk_workers + 1}
+    if scheduler_options is not None:
+        session_options['scheduler'] = scheduler_options
+    dp = DirectPlus(StubServer.CREDENTIALS, *StubServer.FLAGS, session_options=session_options)
+    stop = threading.Event()
+    bulk_calls = []
+
+    def bulk(worker: int) -> None:
+        number = worker * 10 ** 6
+        with request_context('bulk', BULK):
+            while not stop.is_set():
+                dp.enrich_duns(f'{number:09d}', BLOCK_IDS)
+                bulk_calls.append(1)
+                number += 1
+
+    latencies = []
+    with ThreadPoolExecutor(max_workers=args.bulk_workers) as executor:
+        futures = [executor.submit(bulk, worker) for worker in range(1, args.bulk_workers + 1)]
+        # Let the bulk job fill the queues first.
+        time.sleep(args.warmup)
+        start = time.perf_counter()
+        with request_context('lookup', INTERACTIVE):
+            for number in range(args.lookups):
+                lookup_start = time.perf_counter()
+                dp.enrich_duns(f'{number:09d}', BLOCK_IDS)
+                latencies.append(time.perf_counter() - lookup_start)
+        seconds = time.perf_counter() - start
+        stop.set()
+        for future in futures:
+            future.result()
+
+    name = 'with scheduler' if scheduler_options is not None else 'without scheduler'
+    print(f"{name:18} interactive p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms   bulk {len(bulk_calls) / seconds:8.1f} calls/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lookups', type=int, default=200, help='Sequential interactive lookups.')
+    parser.add_argument('--bulk-workers', type=int, default=32, help='Threads of the bulk job.')
+    parser.add_argument('--max-concurrency', type=int, default=8, help='Requests in flight with the scheduler.')
+    parser.add_argument('--reserved', type=int, default=1, help='Slots reserved for interactive requests.')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds before every stub response.')
+    parser.add_argument('--capacity', type=int, default=8, help='Requests the stub server answers at a time.')
+    parser.add_argument('--warmup', type=float, default=0.5, help='Seconds the bulk job runs before the lookups.')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with StubServer(latency=args.latency, capacity=args.capacity) as stub:
+        run(stub, args)
+        run(stub, args, {'max_concurrency': args.max_concurrency, 'reserved': args.reserved})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Local stand-in for the Direct+ API, so the package can be benchmarked offline and reproducibly.
+
+Serves the token, entitlements, dataBlocks, searchCriteria, IDRCleanseMatch and familyTree endpoints. Payloads are
+synthetic and sized like real responses, or recorded responses read from a directory (one <endpoint>.json file per
+endpoint, e.g. dataBlocks.json). Every data endpoint answers after a configurable latency and fails with a configurable
+rate. Point a DirectPlus object at it with the session option base_url:
+
+    stub = StubServer(latency=0.02, error_rate=0.01)
+    dp = DirectPlus(StubServer.CREDENTIALS, *StubServer.FLAGS, session_options={'base_url': stub.url, 'cache': False})
+
+or run it on its own:
+
+    python -m benchmarks.stub_server --port 8080 --latency 0.05
+"""
+import argparse
+import http.server
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.json_decode import synthetic_payload
+
+ENTITLEMENTS = {
+    'subscriber': {'subscriberType': 'Internal'},
+    'product': {'contractType': 'Standard', 'status': 'Active'},
+    'apiKey': {'keyType': 'Production'},
+    'entitlements': [
+        {'entitlementID': entitlement_id, 'levels': levels} for entitlement_id, levels in (
+            ('companyinfo', ['L1', 'L2', 'L3']),
+            ('principalscontacts', ['L1', 'L2']),
+            ('hierarchyconnections', ['L1']),
+            ('financialstrengthinsight', ['L1', 'L2']),
+            ('dataBlocks', ['L1']),
+            ('searchCriteria', ['L1']),
+            ('IDRCleanseMatch', ['L1']),
+            ('familyTreeFull', ['L1']),
+            ('entitlements', ['L1']),
+        )
+    ],
+}
+
+# (method, path prefix, endpoint) of the paths the stub serves.
+ROUTES = (
+    ('POST', '/v2/token', 'token'),
+    ('GET', '/v1/entitlements', 'entitlements'),
+    ('GET', '/v1/data/duns/', 'dataBlocks'),
+    ('POST', '/v1/search/criteria', 'searchCriteria'),
+    ('GET', '/v1/match/cleanseMatch', 'IDRCleanseMatch'),
+    ('GET', '/v1/familyTree/', 'familyTreeFull'),
+)
+
+
+def _duns(number: int) -> str:
+    return f'{number % 10 ** 9:09d}'
+
+
+class StubServer:
+    """
+    Serves Direct+ responses on 127.0.0.1 from a background thread.
+
+    :param port: Port to listen on. Defaults to a free port.
+    :param latency: Seconds every data endpoint waits before answering.
+    :param jitter: Up to this many seconds are added to the latency at random.
+    :param error_rate: Fraction of data endpoint requests that fail with error_status.
+    :param error_status: HTTP status of failed requests. Defaults to 500.
+    :param payload_dir: Directory with recorded responses named <endpoint>.json. Synthetic payloads are used for
+        endpoints without a file.
+    :param members: Size of the synthetic dataBlocks payload, see benchmarks.json_decode.synthetic_payload.
+    :param search_hits: Number of candidates every search matches.
+    :param family_size: Number of members of every family tree.
+    :param seed: Seed of the latency jitter, the injected errors and the synthetic payloads.
+    :param capacity: Number of data requests served at a time, like a rate limited API. Others wait.
+        Defaults to None, no limit.
+    """
+    CREDENTIALS = {'key': 'a' * 64, 'secret': 'b' * 64}
+    # Flags the stub entitlements pass the AccessManager checks with.
+    FLAGS = ('ALLOW_INTERNAL', 'PRODUCTION')
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, payload_dir: Union[str, Path] = None, members: int = 100,
+                 search_hits: int = 500, family_size: int = 2500, seed: int = 0,
+                 capacity: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.search_hits = search_hits
+        self.family_size = family_size
+        self.requests = Counter()
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._capacity = threading.Semaphore(capacity) if capacity is not None else None
+
+        random.seed(seed)
+        self.payloads = {'dataBlocks': synthetic_payload(members)}
+        if payload_dir is not None:
+            self.payloads.update({file.stem: file.read_bytes() for file in Path(payload_dir).glob('*.json')})
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> 'StubServer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                with stub._lock:
+                    stub.connections += 1
+                super().setup()
+                # Headers and body are written separately; without this, Nagle's algorithm delays the body by the
+                # client's delayed ACK (40 ms on Linux).
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _reply(self, method: str) -> None:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                status, payload = stub.respond(method, self.path, body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._reply('GET')
+
+            def do_POST(self):
+                self._reply('POST')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _delay_and_fail(self) -> bool:
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+        if self._capacity is not None:
+            with self._capacity:
+                time.sleep(delay)
+        elif delay > 0:
+            time.sleep(delay)
+        return fail
+
+    def respond(self, method: str, path: str, body: dict) -> Tuple[int, bytes]:
+        """
+        Returns the status and body of the response to a request.
+        """
+        url = urlsplit(path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        route = next((name for route_method, prefix, name in ROUTES
+                      if method == route_method and url.path.startswith(prefix)), None)
+        with self._lock:
+            self.requests[route or 'unknown'] += 1
+
+        if route is None:
+            return 404, json.dumps({'error': {'errorCode': '00004', 'errorMessage': 'Unknown path'}}).encode()
+        if route == 'token':
+            return 200, json.dumps({'access_token': 'stub-token', 'expiresIn': 86400}).encode()
+        if route == 'entitlements':
+            return 200, json.dumps(ENTITLEMENTS).encode()
+
+        if self._delay_and_fail():
+            error = {'errorCode': '00001', 'errorMessage': 'Injected error'}
+            return self.error_status, json.dumps({'error': error}).encode()
+        if route in self.payloads:
+            return 200, self.payloads[route]
+        if route == 'searchCriteria':
+            return 200, self._search(body)
+        if route == 'IDRCleanseMatch':
+            return 200, self._match(query)
+        return 200, self._family_tree(url.path.rsplit('/', 1)[-1], query)
+
+    def _search(self, criteria: dict) -> bytes:
+        page_size = int(criteria.get('pageSize', 50))
+        page_number = int(criteria.get('pageNumber', 1))
+        first = (page_number - 1) * page_size
+        candidates = [
+            {
+                'displaySequence': index + 1,
+                'organization': {
+                    'duns': _duns(100000000 + index),
+                    'primaryName': f'Company {index}',
+                    'primaryAddress': {'addressCountry': {'isoAlpha2Code': 'US'}, 'postalCode': '10001'},
+                    'numberOfEmployees': [{'value': index % 5000}],
+                },
+            }
+            for index in range(first, min(first + page_size, self.search_hits))
+        ]
+        return json.dumps({
+            'inquiryDetail': criteria,
+            'candidatesMatchedQuantity': self.search_hits,
+            'candidatesReturnedQuantity': len(candidates),
+            'searchCandidates': candidates,
+        }).encode()
+
+    @staticmethod
+    def _match(query: dict) -> bytes:
+        candidates = [
+            {
+                'displaySequence': rank + 1,
+                'organization': {
+                    'duns': _duns(200000000 + rank),
+                    'primaryName': query.get('name', 'Company'),
+                    'primaryAddress': {'addressCountry': {'isoAlpha2Code': query.get('countryISOAlpha2Code', 'US')}},
+                },
+                'matchQualityInformation': {'confidenceCode': 10 - rank, 'matchGrade': 'AAAAAAAAAAA'},
+            }
+            for rank in range(int(query.get('candidateMaximumQuantity', 5)))
+        ]
+        return json.dumps({
+            'inquiryDetail': query,
+            'candidatesMatchedQuantity': len(candidates),
+            'matchCandidates': candidates,
+        }).encode()
+
+    def _family_tree(self, duns: str, query: dict) -> bytes:
+        page_size = int(query.get('page[size]', 1000))
+        page_number = int(query.get('page[number]', 1))
+        first = (page_number - 1) * page_size
+        base = int(duns) if duns.isdigit() else 0
+        members = []
+        for index in range(first, min(first + page_size, self.family_size)):
+            member = {
+                'duns': _duns(base + index),
+                'primaryName': f'Member {index}',
+                'corporateLinkage': {'hierarchyLevel': 1 + (index > 0) + (index > 10)},
+            }
+            if index > 0:
+                # Every member's parent is a member with a lower index, ten children per parent.
+                member['corporateLinkage']['parent'] = {'duns': _duns(base + (index - 1) // 10)}
+            members.append(member)
+        return json.dumps({
+            'inquiryDetail': {'duns': duns, 'page': {'pageSize': page_size, 'pageNumber': page_number}},
+            'globalUltimateDuns': duns,
+            'globalUltimateFamilyTreeMembersCount': self.family_size,
+            'branchesExcludedMembersCount': 0,
+            'familyTreeMembers': members,
+        }).encode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before every data response.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency, up to this many seconds.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of data requests that fail.')
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--payload-dir', help='Directory with recorded responses named <endpoint>.json.')
+    parser.add_argument('--capacity', type=int, help='Data requests served at a time.')
+    args = parser.parse_args()
+
+    stub = StubServer(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      error_status=args.error_status, payload_dir=args.payload_dir, capacity=args.capacity)
+    print(f"Serving Direct+ stub on {stub.url}. Use the session option base_url={stub.url!r}.")
+    try:
+        stub._thread.join()
+    except KeyboardInterrupt:
+        stub.close()
+
+
+if __name__ == '__main__':
+    main()
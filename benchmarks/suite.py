@@ -0,0 +1,168 @@
+"""
+Offline benchmark suite. Runs the package against the local Direct+ stub server (benchmarks/stub_server.py) and
+reports throughput and latency of single calls, bulk enrichment, paged search, matching, family tree crawling,
+flattening and export. No credentials or network access are needed, and runs with the same options are comparable.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --latency 0.05 --jitter 0.02 --error-rate 0.01 --duns 500 --workers 16
+    python -m benchmarks.suite --only single bulk --payload-dir recorded/
+"""
+import argparse
+import logging
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List
+
+from benchmarks.stub_server import StubServer
+from src.direct_plus import DirectPlus
+from src.exceptions import DunsException
+from src.search_criteria import SearchCriteriaManager
+from src.transformer.csv_exporter import CSVExporter
+from src.transformer.flattener import Flattener
+from src.transformer.xlsx_exporter import XLSXExporter
+
+BLOCK_IDS = 'companyinfo_L2_v1,principalscontacts_L1_v2'
+
+
+def report(name: str, seconds: float, operations: int, latencies: List[float] = None, unit: str = 'ops') -> None:
+    line = f"{name:24} {operations:7d} {unit:8} {seconds:8.3f} s {operations / seconds:10.1f} {unit}/s"
+    if latencies:
+        latencies = sorted(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        line += f"   p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms"
+    print(line)
+
+
+def timed(function: Callable, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    except (DunsException, ValueError):
+        # Injected errors; counted through the metrics of the DirectPlus object.
+        return None
+    finally:
+        timed.latencies.append(time.perf_counter() - start)
+
+
+def bench_single(dp: DirectPlus, args) -> List[dict]:
+    timed.latencies = []
+    start = time.perf_counter()
+    results = [timed(dp.enrich_duns, f'{number:09d}', BLOCK_IDS) for number in range(args.calls)]
+    report('single enrich_duns', time.perf_counter() - start, args.calls, timed.latencies)
+    return [result for result in results if result is not None]
+
+
+def bench_bulk(dp: DirectPlus, args) -> List[dict]:
+    dp.session.ensure_pool_size(args.workers)
+    timed.latencies = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(lambda number: timed(dp.enrich_duns, f'{number:09d}', BLOCK_IDS),
+                                    range(args.duns)))
+    report(f'bulk enrich x{args.workers}', time.perf_counter() - start, args.duns, timed.latencies)
+    return [result for result in results if result is not None]
+
+
+def bench_search(dp: DirectPlus, args) -> None:
+    start = time.perf_counter()
+    try:
+        hits = SearchCriteriaManager(dp, countryISOAlpha2Code='US').get_hits()
+    except ValueError as e:
+        print(f"{'paged search':24} failed: {e}")
+        return
+    report('paged search', time.perf_counter() - start, len(hits), unit='hits')
+
+
+def bench_match(dp: DirectPlus, args) -> None:
+    timed.latencies = []
+    start = time.perf_counter()
+    for number in range(args.calls):
+        timed(dp.match, name=f'Company {number}', countryISOAlpha2Code='US')
+    report('match', time.perf_counter() - start, args.calls, timed.latencies)
+
+
+def bench_family_tree(dp: DirectPlus, args) -> None:
+    start = time.perf_counter()
+    try:
+        members = sum(1 for _ in dp.family_tree_crawler('804735132', workers=args.workers))
+    except ValueError as e:
+        print(f"{'family tree crawl':24} failed: {e}")
+        return
+    report('family tree crawl', time.perf_counter() - start, members, unit='members')
+
+
+def bench_flatten(results: List[dict]) -> List[dict]:
+    flattener = Flattener()
+    start = time.perf_counter()
+    flattened = [flattener.flatten(result) for result in results]
+    report('flatten', time.perf_counter() - start, len(flattened), unit='records')
+    return flattened
+
+
+def bench_export(flattened: List[dict]) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        CSVExporter.run(flattened, str(Path(directory) / 'export.csv'))
+        report('export csv', time.perf_counter() - start, len(flattened), unit='records')
+
+        start = time.perf_counter()
+        try:
+            XLSXExporter.run(flattened, str(Path(directory) / 'export.xlsx'))
+        except NotImplementedError:
+            # Raised after the workbook is saved, as a warning about None values.
+            pass
+        report('export xlsx', time.perf_counter() - start, len(flattened), unit='records')
+
+
+BENCHMARKS = ('single', 'bulk', 'search', 'match', 'familytree', 'flatten', 'export')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--calls', type=int, default=100, help='Sequential calls of the single call benchmarks.')
+    parser.add_argument('--duns', type=int, default=1000, help='Duns numbers of the bulk enrichment.')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.01, help='Seconds before every stub response.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency, up to this many seconds.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub responses that fail.')
+    parser.add_argument('--members', type=int, default=100, help='Size of the synthetic dataBlocks payload.')
+    parser.add_argument('--search-hits', type=int, default=500)
+    parser.add_argument('--family-size', type=int, default=2500)
+    parser.add_argument('--payload-dir', help='Directory with recorded responses named <endpoint>.json.')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with StubServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, members=args.members,
+                    search_hits=args.search_hits, family_size=args.family_size,
+                    payload_dir=args.payload_dir) as stub:
+        session_options = {'base_url': stub.url, 'cache': False}
+        dp = DirectPlus(StubServer.CREDENTIALS, *StubServer.FLAGS, session_options=session_options)
+
+        results = []
+        if 'single' in args.only:
+            results += bench_single(dp, args)
+        if 'bulk' in args.only:
+            results += bench_bulk(dp, args)
+        if 'search' in args.only:
+            bench_search(dp, args)
+        if 'match' in args.only:
+            bench_match(dp, args)
+        if 'familytree' in args.only:
+            bench_family_tree(dp, args)
+        if {'flatten', 'export'} & set(args.only):
+            if not results:
+                results = [dp.enrich_duns(f'{number:09d}', BLOCK_IDS) for number in range(args.calls)]
+            flattened = bench_flatten(results)
+            if 'export' in args.only:
+                bench_export(flattened)
+
+        errors = dp.metrics.counter('directplus_errors_total')
+        print(f"\nstub requests: {dict(stub.requests)}, connections: {stub.connections}, errors: {errors:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,13 @@
-import yaml
-import os
+from src.config import configure_logging
+from src.custom_logging import add_log_levels
 
-from src.custom_logging import logging_setup
+# Only registers the custom levels, so .trace() and friends exist. Handlers are set up by configure_logging.
+add_log_levels()
 
-current_dir = os.getcwd()
 
-# Find the project root by traversing up the directory tree
-while not os.path.isfile(os.path.join(current_dir, 'README.md')):
-    # Change to the parent directory
-    current_dir = os.path.dirname(current_dir)
-
-project_root = current_dir
-
-logging_setup()
-
-with open(f'{project_root}/environment.yaml', 'r') as stream:
-    config = yaml.safe_load(stream)
-
-API_CREDENTIALS = config.get('credentials')
+def __getattr__(name: str):
+    # Credentials are read from environment.yaml on first use instead of on import.
+    if name == 'API_CREDENTIALS':
+        from src.config import config
+        return config.credentials
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
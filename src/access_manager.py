@@ -79,8 +79,15 @@ class AccessManager:
 
     @property
     def entitlements(self) -> List[dict]:
+        return [ent for ent in self.all_entitlements if len(ent.get('levels') or []) > 0]
+
+    @property
+    def all_entitlements(self) -> List[dict]:
+        """
+        Every entitlement, including the ones with an empty levels list, such as side blocks.
+        """
         if self._entitlements is None:
-            self._entitlements = [ent for ent in self.get_entitlements().get('entitlements') if len(ent.get('levels')) > 0]
+            self._entitlements = self.get_entitlements().get('entitlements') or []
             self.log.debug(f"Entitlements: {self._entitlements}")
         return self._entitlements
 
@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Union
+
+from src.blocks import parse_block_id, block_fields
+
+
+def _deep_merge(target: dict, source: dict) -> dict:
+    """
+    Merges source into target. Some fields are delivered by several blocks, e.g. corporateLinkage by companyinfo and
+    hierarchyconnections, each with a part of the object, so objects are merged key by key instead of replaced. Empty
+    values never replace values that are already there.
+    """
+    for key, value in source.items():
+        existing = target.get(key)
+        if isinstance(existing, dict) and isinstance(value, dict):
+            target[key] = _deep_merge(dict(existing), value)
+        elif (value is not None and value != [] and value != {}) or key not in target:
+            target[key] = value
+    return target
+
+
+class BlockCache:
+    """
+    Caches dataBlocks responses per duns number and block. A response for several blocks is split into one entry per
+    block, using the organization fields each block delivers (see src/blocks.py). Fields that are not attributed to
+    any requested block are kept with every block of that response, so nothing is lost.
+
+    Every block entry is stored and expires on its own, so a later request only has to fetch the blocks that are
+    missing or expired. The cached and fetched blocks are merged back into one response; fields that several blocks
+    deliver are merged key by key.
+
+    :param directory: Directory to store the entries in. Defaults to src/cache/blocks.
+    :param ttl: Time to live in seconds, either one value for all blocks or a dictionary of block family name to
+    seconds with an optional 'default' key. Defaults to one day.
+    """
+    def __init__(self, directory: Union[str, Path] = None, ttl: Union[int, Dict[str, int]] = 24 * 60 * 60):
+        self.log = logging.getLogger(__name__)
+        self.directory = Path(directory) if directory else Path(__file__).parent / 'cache' / 'blocks'
+        self.ttl = ttl
+
+    def _ttl(self, block_id: str) -> int:
+        if not isinstance(self.ttl, dict):
+            return self.ttl
+        block, _ = parse_block_id(block_id)
+        return self.ttl.get(block.name, self.ttl.get('default', 24 * 60 * 60))
+
+    def _path(self, duns: str, block_id: str) -> Path:
+        return self.directory / duns / f"{block_id}.json"
+
+    def get(self, duns: str, block_id: str) -> Union[dict, None]:
+        """
+        Returns the cached entry of a block, or None if it is not cached or has expired.
+
+        :param duns:
+        :param block_id:
+        :return:
+        """
+        path = self._path(duns, block_id)
+        try:
+            with open(path, 'r', encoding='UTF8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if time.time() - entry.get('retrieved_at', 0) > self._ttl(block_id):
+            self.log.debug(f"Cached block {block_id} for {duns} has expired.")
+            return None
+        return entry
+
+    def put(self, duns: str, block_id: str, entry: dict) -> None:
+        path = self._path(duns, block_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'w', encoding='UTF8') as f:
+            json.dump(entry, f)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def split(response: dict, block_ids: List[str]) -> Dict[str, dict]:
+        """
+        Splits a dataBlocks response into one entry per block.
+
+        :param response: Decoded dataBlocks response.
+        :param block_ids: Block IDs that were requested.
+        :return: Dictionary of block ID -> entry.
+        """
+        organization = response.get('organization') or {}
+        status = {s.get('blockID'): s for s in response.get('blockStatus') or []}
+        fields = {block_id: set(block_fields(block_id)) for block_id in block_ids}
+        attributed = set().union(*fields.values())
+        unattributed = {k: v for k, v in organization.items() if k not in attributed}
+
+        retrieved_at = time.time()
+        entries = {}
+        for block_id in block_ids:
+            entries[block_id] = {
+                'retrieved_at': retrieved_at,
+                'transactionDetail': response.get('transactionDetail'),
+                'blockStatus': status.get(block_id, {'blockID': block_id}),
+                'organization': {
+                    **{k: v for k, v in organization.items() if k in fields[block_id]},
+                    **unattributed,
+                },
+            }
+        return entries
+
+    @staticmethod
+    def merge(duns: str, block_ids: List[str], entries: Dict[str, dict]) -> dict:
+        """
+        Merges block entries into one dataBlocks response.
+
+        :param duns:
+        :param block_ids: Block IDs in the order they were requested.
+        :param entries: Dictionary of block ID -> entry.
+        :return:
+        """
+        organization = {}
+        for block_id in block_ids:
+            _deep_merge(organization, entries[block_id].get('organization') or {})
+
+        latest = max((entries[block_id] for block_id in block_ids), key=lambda e: e.get('retrieved_at', 0))
+        return {
+            'transactionDetail': latest.get('transactionDetail'),
+            'inquiryDetail': {'duns': duns, 'blockIDs': list(block_ids)},
+            'blockStatus': [entries[block_id].get('blockStatus') for block_id in block_ids],
+            'organization': organization,
+        }
+
+    def store(self, duns: str, response: dict, block_ids: List[str]) -> Dict[str, dict]:
+        """
+        Splits a response and stores every block. Returns the entries.
+
+        :param duns:
+        :param response:
+        :param block_ids:
+        :return:
+        """
+        entries = self.split(response, block_ids)
+        for block_id, entry in entries.items():
+            self.put(duns, block_id, entry)
+        return entries
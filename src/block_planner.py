@@ -0,0 +1,118 @@
+import logging
+from typing import Dict, List, Union
+
+from src.blocks import DataBlock, SideBlock, COMMON_FIELDS
+from src.exceptions import BlockPlanException
+
+
+class BlockPlanner:
+    """
+    Picks the smallest set of blocks, at the lowest levels, that delivers the fields a job needs. Candidate blocks are
+    filtered by the entitlements that are actually held, so a plan never contains a block or level that would be
+    refused.
+
+    Fields are organization fields, given either as top level names ('industryCodes') or as flattened paths
+    ('organization.industryCodes.0.code'). Each field is mapped to the blocks that deliver it using the 'fields'
+    metadata in src/blocks.py. Blocks are then chosen greedily: the block covering most of the remaining fields first,
+    ties going to data blocks over side blocks, then to the lower minimum level and then to the lower order.
+
+    Levels cannot be derived from the field metadata: a field that is only delivered at a higher level, e.g. by
+    companyinfo_L2, maps to the block's minimum level. Pass min_levels to plan for those fields.
+
+    :param entitlements: Entitlements as returned by AccessManager.all_entitlements. An entitlement with an empty levels
+    list, as side blocks have, is held without levels. If None, every block and level is assumed to be available.
+    :param delimiter: Delimiter used in flattened paths. Defaults to '.'.
+    """
+    def __init__(self, entitlements: List[dict] = None, delimiter: str = '.'):
+        self.log = logging.getLogger(__name__)
+        self.delimiter = delimiter
+        self.entitled_levels = None
+        if entitlements is not None:
+            self.entitled_levels = {
+                entitlement.get('entitlementID'): sorted(
+                    int(level.lstrip('Ll')) for level in entitlement.get('levels') or [] if level.lstrip('Ll').isdigit()
+                )
+                for entitlement in entitlements
+            }
+
+    def _field_name(self, field: str) -> str:
+        parts = field.split(self.delimiter)
+        if parts[0] == 'organization' and len(parts) > 1:
+            return parts[1]
+        return parts[0]
+
+    def _level(self, block: Union[DataBlock, SideBlock], min_level: int = None) -> Union[int, None]:
+        """
+        Returns the lowest usable level of a block that is at least min_level, None for an entitled side block, or -1
+        if the block cannot be used.
+        """
+        if isinstance(block, SideBlock):
+            if self.entitled_levels is None or block.name in self.entitled_levels:
+                return None
+            return -1
+
+        required = max(block.value.get('min_level'), min_level or 0)
+        if required > block.value.get('max_level'):
+            return -1
+        if self.entitled_levels is None:
+            return required
+        for level in self.entitled_levels.get(block.name, []):
+            if required <= level <= block.value.get('max_level'):
+                return level
+        return -1
+
+    def plan(self, fields: List[str], min_levels: Dict[str, int] = None) -> List[str]:
+        """
+        Returns the block IDs to request, ordered by block order.
+
+        :param fields: Fields the job needs.
+        :param min_levels: Minimum level per block family name, for fields that are only delivered at higher levels,
+        e.g. {'companyinfo': 2}.
+        :return:
+        """
+        min_levels = min_levels or {}
+        needed = {self._field_name(field) for field in fields} - set(COMMON_FIELDS)
+
+        candidates = {}
+        for block in list(DataBlock) + list(SideBlock):
+            level = self._level(block, min_levels.get(block.name))
+            if level == -1:
+                continue
+            covered = needed & set(block.value.get('fields', []))
+            if covered:
+                candidates[block] = (level, covered)
+
+        uncovered = needed - set().union(*(covered for _, covered in candidates.values()))
+        if uncovered:
+            raise BlockPlanException(f"No entitled block delivers the fields {sorted(uncovered)}.")
+
+        chosen = {}
+        remaining = set(needed)
+        while remaining:
+            block = max(candidates, key=lambda b: (
+                len(candidates[b][1] & remaining),
+                isinstance(b, DataBlock),
+                -(candidates[b][0] or 0),
+                -b.value.get('order'),
+            ))
+            chosen[block] = candidates[block][0]
+            remaining -= candidates.pop(block)[1]
+
+        if not any(isinstance(block, DataBlock) for block in chosen):
+            # Only common fields or side block fields are needed, and side blocks are only delivered with a data block.
+            # Use the cheapest usable data block.
+            for block in sorted(DataBlock, key=lambda b: (b.value.get('min_level'), b.value.get('order'))):
+                level = self._level(block, min_levels.get(block.name))
+                if level != -1:
+                    chosen[block] = level
+                    break
+            else:
+                raise BlockPlanException("No entitled data block available.")
+
+        block_ids = [
+            block.level(level) if isinstance(block, DataBlock) else str(block)
+            for block, level in sorted(chosen.items(), key=lambda item: (
+                isinstance(item[0], SideBlock), item[0].value.get('order')))
+        ]
+        self.log.debug(f"Planned blocks {block_ids} for fields {sorted(needed)}.")
+        return block_ids
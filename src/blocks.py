@@ -6,133 +6,214 @@ class DataBlock(Enum):
         "version": 1,
         "order": 1,
         "min_level": 1,
-        "max_level": 3
+        "max_level": 3,
+        "fields": [
+            "businessActivityInsight"
+        ]
     }
     companyfinancials = {
         "version": 3,
         "order": 2,
         "min_level": 1,
-        "max_level": 4
+        "max_level": 4,
+        "fields": [
+            "latestFiscalFinancials", "otherFinancials"
+        ]
     }
     companyinfo = {
         "version": 1,
         "order": 3,
         "min_level": 1,
-        "max_level": 4
+        "max_level": 4,
+        "fields": [
+            "dunsControlStatus", "localOperatingStatus", "registeredName", "multilingualPrimaryName",
+            "multilingualRegisteredNames", "summary", "tradeStyleNames", "multilingualTradestyleNames",
+            "formerPrimaryNames", "formerRegisteredNames", "defaultCurrency", "websiteAddress", "email",
+            "certifiedEmail", "telephone", "primaryAddress", "multilingualPrimaryAddress", "registeredAddress",
+            "multilingualRegisteredAddress", "mailingAddress", "formerPrimaryAddresses", "formerRegisteredAddresses",
+            "stockExchanges", "standardizedStockExchanges", "isForbesLargestPrivateCompaniesListed",
+            "isFortune1000Listed", "thirdPartyAssessment", "registrationNumbers", "primaryIndustryCode",
+            "industryCodes", "unspscCodes", "isNonClassifiedEstablishment", "activities", "startDate",
+            "incorporatedDate", "businessEntityType", "legalForm", "controlOwnershipDate", "controlOwnershipType",
+            "operations", "charterType", "isAgent", "isImporter", "isExporter", "subjectComments",
+            "registeredDetails", "numberOfEmployees", "financials", "individualStatementYearlyRevenue",
+            "fiscalYearEnd", "banks", "isSmallBusiness", "isStandalone", "competitors", "otherCompetitors",
+            "regulations", "franchiseOperationType", "assignmentModel", "organizationSizeCategory",
+            "employerDesignation", "individualNetWorthToTotalAssets", "netWorthToTotalAssets", "preferredLanguage",
+            "suppliers", "customers", "lineOfBusinessSummary", "multiLingualSearchNames",
+            "imperialCalendarStartYear", "businessTrustIndex", "securitiesReportID", "tsrCommodityCodes",
+            "investigationDate", "tsrReportDate", "corporateLinkage"
+        ]
     }
     diversityinsight = {
         "version": 1,
         "order": 4,
         "min_level": 1,
-        "max_level": 3
+        "max_level": 3,
+        "fields": [
+            "socioEconomicInformation"
+        ]
     }
     dtri = {
         "version": 1,
         "order": 5,
         "min_level": 1,
-        "max_level": 3
+        "max_level": 3,
+        "fields": [
+            "dtri"
+        ]
     }
     educationaldata = {
         "version": 1,
         "order": 6,
         "min_level": 1,
-        "max_level": 2
+        "max_level": 2,
+        "fields": [
+            "educationalData"
+        ]
     }
     esginsight = {
         "version": 1,
         "order": 7,
         "min_level": 3,
-        "max_level": 3
+        "max_level": 3,
+        "fields": [
+            "esgIndustryCategories", "esgRanking"
+        ]
     }
     eventfilings = {
         "version": 1,
         "order": 8,
         "min_level": 1,
-        "max_level": 3
+        "max_level": 3,
+        "fields": [
+            "hasCompanyMoved", "documentFilings", "legalEvents", "commercialCollectionClaims", "financingEvents",
+            "significantEvents", "awards", "exclusions", "violations"
+        ]
     }
     externaldisruptioninsight = {
         "version": 1,
         "order": 9,
         "min_level": 1,
-        "max_level": 4
+        "max_level": 4,
+        "fields": [
+            "hurricaneVulnerabilityScore"
+        ]
     }
     financialstrengthinsight = {
         "version": 1,
         "order": 10,
         "min_level": 1,
-        "max_level": 4
+        "max_level": 4,
+        "fields": [
+            "delinquencyScoreNorms", "failureScoreNorms", "isHighRiskBusiness", "isDeterioratingBusiness",
+            "dnbAssessment", "layOffScore", "tsrRating", "tsrRatingHistory"
+        ]
     }
     globalbusinessranking = {
         "version": 1,
         "order": 11,
         "min_level": 1,
-        "max_level": 1
+        "max_level": 1,
+        "fields": [
+            "globalBusinessRanking"
+        ]
     }
     globalfinancials = {
         "version": 1,
         "order": 12,
         "min_level": 1,
-        "max_level": 2
+        "max_level": 2,
+        "fields": [
+            "standardizedFinancials"
+        ]
     }
     hierarchyconnections = {
         "version": 1,
         "order": 13,
         "min_level": 1,
-        "max_level": 1
+        "max_level": 1,
+        "fields": [
+            "corporateLinkage", "industrialPlantsCount", "affiliates"
+        ]
     }
     inquiryinsight = {
         "version": 1,
         "order": 14,
         "min_level": 1,
-        "max_level": 4
+        "max_level": 4,
+        "fields": [
+            "inquiryInsight"
+        ]
     }
     ownershipinsight = {
         "version": 1,
         "order": 15,
         "min_level": 1,
-        "max_level": 1
+        "max_level": 1,
+        "fields": [
+            "shareOwnership", "capitalDetails"
+        ]
     }
     paymentinsight = {
         "version": 1,
         "order": 16,
         "min_level": 1,
-        "max_level": 4
+        "max_level": 4,
+        "fields": [
+            "normsCalculationTimestamp", "businessTradingNorms", "businessTrading", "businessTradingNormsHistory"
+        ]
     }
     principalscontacts = {
         "version": 2,
         "order": 17,
         "min_level": 1,
-        "max_level": 4
+        "max_level": 4,
+        "fields": [
+            "principalsSummary", "currentPrincipals", "formerPrincipals", "mostSeniorPrincipal"
+        ]
     }
     salesmarketinginsight = {
         "version": 2,
         "order": 18,
         "min_level": 1,
-        "max_level": 3
+        "max_level": 3,
+        "fields": [
+            "financialServicesProspectorModel", "salesMarketingAssessment"
+        ]
     }
     shippinginsight = {
         "version": 1,
         "order": 19,
         "min_level": 1,
-        "max_level": 1
+        "max_level": 1,
+        "fields": [
+            "shipmentInformation"
+        ]
     }
     supplychainriskindex = {
         "version": 1,
         "order": 20,
         "min_level": 1,
-        "max_level": 1
+        "max_level": 1,
+        "fields": [
+            "supplyChainRiskIndex"
+        ]
     }
     thirdpartyriskinsight = {
         "version": 3,
         "order": 21,
         "min_level": 1,
-        "max_level": 1
+        "max_level": 1,
+        "fields": [
+            "thirdPartyRiskAssessment"
+        ]
     }
 
     def level(self, level_int=None):
         # Only takes an int as format_spec. Make sure int is between min_level and max_level inclusive.
         if level_int is None:
-            format_spec = self.value.get('min_level')
+            level_int = self.value.get('min_level')
         else:
             level_int = int(level_int)
             if level_int < self.value.get('min_level'):
@@ -145,28 +226,82 @@ class DataBlock(Enum):
 class SideBlock(Enum):
     companyfinancials_abridged = {
         "version": 1,
-        "order": 1
+        "order": 1,
+        "fields": [
+            "abridgedLatestFiscalFinancials", "abridgedOtherFinancials"
+        ]
     }
     companyfinancials_thirdparty = {
         "version": 1,
-        "order": 2
+        "order": 2,
+        "fields": [
+            "thirdPartyFinancialsAccountantName", "thirdPartyIndustryTemplateCode", "thirdPartyReportStatus",
+            "thirdPartyFinancials", "thirdPartyValuationRatios", "thirdPartyFinancialsComparison"
+        ]
     }
     salesmarketinginsight_foottraffic = {
         "version": 1,
-        "order": 3
+        "order": 3,
+        "fields": [
+            "footTrafficIndex"
+        ]
     }
     hierarchyconnections_alternative = {
         "version": 1,
-        "order": 4
+        "order": 4,
+        "fields": [
+            "corporateLinkage"
+        ]
     }
     hierarchyconnections_eli = {
         "version": 1,
-        "order": 5
+        "order": 5,
+        "fields": [
+            "extendedLinkageInsight"
+        ]
     }
     companyinfo_advgeoposition = {
         "version": 1,
-        "order": 6
+        "order": 6,
+        "fields": [
+            "enhancedGeoLocation"
+        ]
     }
 
     def __str__(self):
         return f"{self.name}_v{self.value.get('version')}"
+
+
+# Organization fields that are part of every block.
+COMMON_FIELDS = ("duns", "countryISOAlpha2Code", "primaryName")
+
+
+def parse_block_id(block_id: str):
+    """
+    Parses a block ID like 'companyinfo_L1_v1' or 'companyinfo_advgeoposition_v1'. Returns the DataBlock or SideBlock
+    and the level, which is None for side blocks. Raises a ValueError if the block ID is unknown.
+
+    :param block_id:
+    :return:
+    """
+    name, separator, version = block_id.rpartition('_v')
+    if not separator or not version.isdigit():
+        raise ValueError(f"Block ID '{block_id}' does not end with a version like '_v1'.")
+    if name in SideBlock.__members__:
+        return SideBlock[name], None
+
+    family, separator, level = name.rpartition('_L')
+    if not separator or not level.isdigit() or family not in DataBlock.__members__:
+        raise ValueError(f"Unknown block ID '{block_id}'.")
+    return DataBlock[family], int(level)
+
+
+def block_fields(block_id: str) -> tuple:
+    """
+    Returns the top level organization fields delivered by a block, including the fields common to all blocks.
+
+    :param block_id:
+    :return:
+    """
+    block, _ = parse_block_id(block_id)
+    return COMMON_FIELDS + tuple(block.value.get('fields', []))
@@ -0,0 +1,317 @@
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Tuple, Union
+
+from src.blocks import DataBlock, SideBlock, parse_block_id
+from src.exceptions import BudgetExceededException, DunsException
+
+if TYPE_CHECKING:
+    from src.direct_plus import DirectPlus
+
+# Cost of a call to an endpoint that is not billed per block. Endpoints that are not listed are free.
+DEFAULT_ENDPOINT_COSTS = {
+    'searchCriteria': 1.0,
+    'IDRCleanseMatch': 1.0,
+    'familyTreeFull': 1.0,
+    'familyTreeUpward': 1.0,
+    'multiProcessJobSubmissionv2': 1.0,
+}
+
+
+class CostModel:
+    """
+    Assigns a cost to a Direct+ call. dataBlocks calls cost the sum of their blocks; a data block costs its level, so
+    companyinfo_L2_v1 costs 2 units and companyinfo_L1_v1 costs 1, and a side block costs 1. Other endpoints cost what
+    endpoint_costs says, or nothing.
+
+    Costs can be set per block family ('companyinfo'), which multiplies the level, or per block and level
+    ('companyinfo_L2'), which replaces it. Use the units of the contract, e.g. price per block.
+
+    :param block_costs: Cost per block family or block and level.
+    :param endpoint_costs: Cost per call of endpoints other than dataBlocks. Defaults to DEFAULT_ENDPOINT_COSTS.
+    """
+    def __init__(self, block_costs: Dict[str, float] = None, endpoint_costs: Dict[str, float] = None):
+        self.block_costs = block_costs or {}
+        self.endpoint_costs = DEFAULT_ENDPOINT_COSTS if endpoint_costs is None else endpoint_costs
+
+    def block_cost(self, block_id: str) -> float:
+        try:
+            block, level = parse_block_id(block_id)
+        except ValueError:
+            # Blocks that are missing from src/blocks.py are charged as one unit, so they never block a call.
+            return self.block_costs.get(block_id, 1.0)
+        if isinstance(block, SideBlock):
+            return self.block_costs.get(block.name, 1.0)
+        if f'{block.name}_L{level}' in self.block_costs:
+            return self.block_costs[f'{block.name}_L{level}']
+        return self.block_costs.get(block.name, 1.0) * level
+
+    def cost(self, endpoint_name: str, blockIDs: str = None) -> float:
+        """
+        Returns the cost of a call.
+
+        :param endpoint_name: E.g. 'dataBlocks'.
+        :param blockIDs: Comma separated block IDs of a dataBlocks call.
+        :return:
+        """
+        if endpoint_name == 'dataBlocks':
+            block_ids = (block_id.strip() for block_id in (blockIDs or '').split(','))
+            return sum(self.block_cost(block_id) for block_id in block_ids if block_id)
+        return self.endpoint_costs.get(endpoint_name, 0.0)
+
+    def cheaper(self, blockIDs: str, min_levels: Dict[str, int] = None) -> Union[str, None]:
+        """
+        Returns blockIDs with the most expensive data block one level lower, or None if no block can go lower. Blocks
+        never go below their minimum level in src/blocks.py or below min_levels. Blocks that are missing from
+        src/blocks.py are kept as they are.
+
+        :param blockIDs: Comma separated block IDs.
+        :param min_levels: Minimum level per block family name, e.g. {'companyinfo': 2}.
+        :return:
+        """
+        min_levels = min_levels or {}
+        block_ids = [block_id.strip() for block_id in blockIDs.split(',') if block_id.strip()]
+        candidates = []
+        for index, block_id in enumerate(block_ids):
+            try:
+                block, level = parse_block_id(block_id)
+            except ValueError:
+                continue
+            if not isinstance(block, DataBlock):
+                continue
+            lowest = max(block.value.get('min_level'), min_levels.get(block.name, 0))
+            if level > lowest:
+                saving = self.block_cost(block_id) - self.block_cost(block.level(level - 1))
+                candidates.append((saving, index, block, level))
+        if not candidates:
+            return None
+        _, index, block, level = max(candidates, key=lambda candidate: candidate[0])
+        block_ids[index] = block.level(level - 1)
+        return ','.join(block_ids)
+
+
+class Budget:
+    """
+    Tracks spend against daily and monthly limits, in the units of a CostModel. Spend is kept in a JSON file if
+    file_path is given, so a job that is restarted, or several jobs run one after another, share the same budget.
+    Safe to use from many threads.
+
+    Calls are charged before they are sent and refunded if they fail, so concurrent workers cannot overspend.
+
+    :param daily: Daily limit. None for no limit.
+    :param monthly: Monthly limit. None for no limit.
+    :param file_path: JSON file the spend is kept in.
+    """
+    def __init__(self, daily: float = None, monthly: float = None, file_path: Union[str, Path] = None):
+        self.log = logging.getLogger(__name__)
+        self.daily = daily
+        self.monthly = monthly
+        self.file_path = Path(file_path) if file_path is not None else None
+        self._lock = threading.Lock()
+        self._state = {'day': None, 'daily_spend': 0.0, 'month': None, 'monthly_spend': 0.0}
+
+        if self.file_path is not None and self.file_path.exists():
+            with open(self.file_path, 'r', encoding='UTF8') as f:
+                self._state.update(json.load(f))
+            self.log.debug(f"Loaded budget state {self._state} from {self.file_path}.")
+
+    @staticmethod
+    def _today() -> datetime.date:
+        return datetime.date.today()
+
+    def _roll_over(self) -> None:
+        # Starts a new day or month. Must be called with the lock held.
+        today = self._today()
+        if self._state['day'] != today.isoformat():
+            self._state['day'] = today.isoformat()
+            self._state['daily_spend'] = 0.0
+        if self._state['month'] != today.strftime('%Y-%m'):
+            self._state['month'] = today.strftime('%Y-%m')
+            self._state['monthly_spend'] = 0.0
+
+    def _save(self) -> None:
+        # Must be called with the lock held.
+        if self.file_path is None:
+            return
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.file_path.with_suffix(self.file_path.suffix + '.tmp')
+        with open(temp_path, 'w', encoding='UTF8') as f:
+            json.dump(self._state, f)
+        os.replace(temp_path, self.file_path)
+
+    @property
+    def spent(self) -> Tuple[float, float]:
+        """
+        Spend of today and of this month.
+        """
+        with self._lock:
+            self._roll_over()
+            return self._state['daily_spend'], self._state['monthly_spend']
+
+    @property
+    def remaining(self) -> float:
+        """
+        What can still be spent today, within both limits. float('inf') without limits.
+        """
+        daily_spend, monthly_spend = self.spent
+        return min(
+            self.daily - daily_spend if self.daily is not None else float('inf'),
+            self.monthly - monthly_spend if self.monthly is not None else float('inf'),
+        )
+
+    def can_afford(self, cost: float) -> bool:
+        return cost <= self.remaining
+
+    def charge(self, cost: float) -> None:
+        """
+        Adds cost to the spend. Raises a BudgetExceededException, and charges nothing, if it does not fit in the daily
+        or monthly limit.
+
+        :param cost:
+        :return:
+        """
+        if cost <= 0:
+            return
+        with self._lock:
+            self._roll_over()
+            if self.daily is not None and self._state['daily_spend'] + cost > self.daily:
+                raise BudgetExceededException(
+                    f"Daily budget exceeded: {self._state['daily_spend']:g} of {self.daily:g} spent, call costs "
+                    f"{cost:g}.")
+            if self.monthly is not None and self._state['monthly_spend'] + cost > self.monthly:
+                raise BudgetExceededException(
+                    f"Monthly budget exceeded: {self._state['monthly_spend']:g} of {self.monthly:g} spent, call costs "
+                    f"{cost:g}.")
+            self._state['daily_spend'] += cost
+            self._state['monthly_spend'] += cost
+            self._save()
+
+    def refund(self, cost: float) -> None:
+        """
+        Takes back a charge, e.g. for a call that failed and is not billed.
+
+        :param cost:
+        :return:
+        """
+        if cost <= 0:
+            return
+        with self._lock:
+            self._roll_over()
+            self._state['daily_spend'] = max(0.0, self._state['daily_spend'] - cost)
+            self._state['monthly_spend'] = max(0.0, self._state['monthly_spend'] - cost)
+            self._save()
+
+
+class WorkItem:
+    """
+    A duns number to enrich, queued in a CostAwareScheduler.
+
+    :param duns:
+    :param blockIDs: Block IDs wanted.
+    :param priority: Business priority. Higher runs first.
+    :param value: Value of the result, to rank items of equal priority by value per unit of cost. Defaults to 1.
+    :param fields: List of paths to extract. See DirectPlus.enrich_duns.
+    :param min_levels: Minimum level per block family the item may be degraded to, e.g. {'companyinfo': 2}.
+    :param degrade: Allow requesting lower block levels when the budget runs short. Defaults to True.
+    """
+    def __init__(self, duns: str, blockIDs: str, priority: int = 0, value: float = 1.0, fields: List[str] = None,
+                 min_levels: Dict[str, int] = None, degrade: bool = True):
+        self.duns = duns
+        self.blockIDs = blockIDs
+        self.priority = priority
+        self.value = value
+        self.fields = fields
+        self.min_levels = min_levels
+        self.degrade = degrade
+
+    def __repr__(self) -> str:
+        return f"WorkItem({self.duns!r}, {self.blockIDs!r}, priority={self.priority})"
+
+
+class CostAwareScheduler:
+    """
+    Enriches queued duns numbers within the budget of a DirectPlus object (see the session option budget).
+
+    Items run by priority, highest first. Items of equal priority run in order of value per unit of cost, so when the
+    budget cannot cover everything, what it covers is worth the most. When the budget left cannot pay for an item,
+    the item is degraded one block level at a time (see CostModel.cheaper) until it fits. Items that do not fit even
+    when degraded as far as allowed stay queued, and run pauses; call run again when the budget has been renewed, e.g.
+    the next day.
+
+    :param dp: DirectPlus instance.
+    """
+    def __init__(self, dp: 'DirectPlus'):
+        self.log = logging.getLogger(__name__)
+        self.dp = dp
+        self.cost_model: CostModel = dp.session.cost_model
+        self.budget: Budget = dp.session.budget
+        self._queue: List[Tuple[int, float, int, WorkItem]] = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @property
+    def pending(self) -> List[WorkItem]:
+        return [item for *_, item in sorted(self._queue)]
+
+    def submit(self, duns: str, blockIDs: str, priority: int = 0, **options) -> WorkItem:
+        """
+        Queues a duns number. See WorkItem for the options.
+
+        :param duns:
+        :param blockIDs:
+        :param priority:
+        :return:
+        """
+        item = WorkItem(duns, blockIDs, priority=priority, **options)
+        value_per_cost = item.value / max(self.cost_model.cost('dataBlocks', item.blockIDs), 1e-9)
+        heapq.heappush(self._queue, (-item.priority, -value_per_cost, next(self._counter), item))
+        return item
+
+    def _affordable(self, item: WorkItem) -> Union[str, None]:
+        """
+        Returns the blockIDs to request for item within the remaining budget, or None if it does not fit.
+        """
+        if self.budget is None:
+            return item.blockIDs
+        remaining = self.budget.remaining
+        blockIDs = item.blockIDs
+        while blockIDs is not None and self.cost_model.cost('dataBlocks', blockIDs) > remaining:
+            blockIDs = self.cost_model.cheaper(blockIDs, item.min_levels) if item.degrade else None
+        return blockIDs
+
+    def run(self) -> Iterator[Tuple[WorkItem, str, dict]]:
+        """
+        Enriches the queued items. Yields (item, blockIDs requested, result) tuples. Items that raise a DunsException
+        are logged and dropped. Stops when the queue is empty or the next item does not fit in the budget.
+
+        :return:
+        """
+        while self._queue:
+            item = self._queue[0][-1]
+            blockIDs = self._affordable(item)
+            if blockIDs is None:
+                self.log.warning(f"Budget exhausted with {len(self._queue)} items queued. Pausing at {item}.")
+                return
+            entry = heapq.heappop(self._queue)
+            if blockIDs != item.blockIDs:
+                self.log.info(f"Degrading {item.duns} from {item.blockIDs} to {blockIDs} to fit the budget.")
+                self.dp.metrics.inc('directplus_degraded_total', endpoint='dataBlocks')
+            try:
+                result = self.dp.enrich_duns(item.duns, blockIDs, fields=item.fields)
+            except DunsException as e:
+                self.log.warning(f"Skipping duns {item.duns}: {e}")
+                continue
+            except BudgetExceededException:
+                # Another user of the budget spent it in the meantime.
+                heapq.heappush(self._queue, entry)
+                self.log.warning(f"Budget exhausted with {len(self._queue)} items queued. Pausing at {item}.")
+                return
+            yield item, blockIDs, result
@@ -0,0 +1,230 @@
+import datetime
+import json
+import logging
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterator, Union
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from src.codec import Codec
+from src.exceptions import CassetteException
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# Parameters that differ between otherwise identical requests and are left out of the request key.
+VOLATILE_PARAMETERS = frozenset({'customerReference'})
+# Response headers that are not recorded: the body is stored decoded, and hop-by-hop headers mean nothing on replay.
+SKIPPED_HEADERS = frozenset({'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie'})
+TOKEN_PATH = '/v2/token'
+
+_LENGTH = struct.Struct('>I')
+
+
+def request_key(request: requests.PreparedRequest) -> str:
+    """
+    Returns the canonical key of a request: method, path, sorted query parameters and the JSON body with sorted keys.
+    The host is not part of the key, so a cassette recorded against Direct+ replays for any base_url.
+
+    :param request:
+    :return:
+    """
+    url = urlsplit(request.url)
+    query = sorted((key, value) for key, value in parse_qsl(url.query, keep_blank_values=True)
+                   if key not in VOLATILE_PARAMETERS)
+    body = request.body or b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if body:
+        try:
+            decoded = json.loads(body)
+        except ValueError:
+            pass
+        else:
+            if isinstance(decoded, dict):
+                decoded = {key: value for key, value in decoded.items() if key not in VOLATILE_PARAMETERS}
+            body = json.dumps(decoded, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return json.dumps([request.method, url.path, query, body.decode('utf-8', 'replace')], separators=(',', ':'))
+
+
+class Cassette:
+    """
+    Records the requests and responses of a session to a file, or replays them from it.
+
+    Every interaction is stored as one compressed, length-prefixed record, so a cassette is compact, is appended to as
+    the run goes, and stays readable if the run is killed. Recording to an existing cassette adds to it. Response
+    bodies are stored decoded. Access tokens are replaced before they are written, and request headers are not written
+    at all.
+
+    On replay, responses are found by request key (see request_key), not by position, so requests may arrive in any
+    order and from many threads. Requests recorded more than once get their responses in turn, starting over when all
+    have been served, so a short recording can drive a longer load test. Each response is delayed by its recorded
+    time divided by speed, or by a fixed latency.
+
+    :param path: Path to the cassette file.
+    :param mode: 'record' or 'replay'.
+    :param speed: Replay speed relative to the recording, e.g. 10 for ten times as fast. Defaults to 1.
+    :param latency: Fixed delay of every replayed response in seconds. Overrides speed.
+    """
+    def __init__(self, path: Union[str, Path], mode: str = REPLAY, speed: float = 1.0, latency: float = None):
+        if mode not in (RECORD, REPLAY):
+            raise CassetteException(f"Cassette mode must be '{RECORD}' or '{REPLAY}', not {mode!r}.")
+        if speed <= 0:
+            raise CassetteException(f"Replay speed must be positive, not {speed}.")
+        self.log = logging.getLogger(__name__)
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self.latency = latency
+        # No dictionary, so a cassette can be replayed on any machine.
+        self.codec = Codec()
+        self._lock = threading.Lock()
+        self._interactions: Dict[str, Deque[dict]] = {}
+
+        if mode == REPLAY:
+            for interaction in self.read():
+                self._interactions.setdefault(interaction['key'], deque()).append(interaction)
+            self.log.debug(f"Loaded {len(self)} interactions for {len(self._interactions)} requests from {self.path}.")
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        return sum(len(interactions) for interactions in self._interactions.values())
+
+    def read(self) -> Iterator[dict]:
+        """
+        Yields the recorded interactions in the order they were recorded. A truncated last record is skipped.
+
+        :return:
+        """
+        if not self.path.exists():
+            raise CassetteException(f"Cassette {self.path} does not exist.")
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(_LENGTH.size)
+                if len(header) < _LENGTH.size:
+                    return
+                length = _LENGTH.unpack(header)[0]
+                record = f.read(length)
+                if len(record) < length:
+                    self.log.warning(f"Cassette {self.path} ends with a truncated record. Skipping it.")
+                    return
+                meta, body = self.codec.decompress(record).split(b'\n', 1)
+                interaction = json.loads(meta)
+                interaction['body'] = body
+                yield interaction
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response, elapsed: float) -> None:
+        """
+        Appends an interaction to the cassette.
+
+        :param request:
+        :param response:
+        :param elapsed: Seconds the server took to answer.
+        :return:
+        """
+        body = response.content
+        if urlsplit(request.url).path == TOKEN_PATH and response.status_code == 200:
+            token = json.loads(body)
+            body = json.dumps({**token, 'access_token': 'recorded'}).encode('utf-8')
+        meta = {
+            'key': request_key(request),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {key: value for key, value in response.headers.items() if key.lower() not in SKIPPED_HEADERS},
+            'elapsed': elapsed,
+        }
+        record = self.codec.compress(json.dumps(meta, separators=(',', ':')).encode('utf-8') + b'\n' + body)
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                f.write(_LENGTH.pack(len(record)) + record)
+
+    def next_interaction(self, request: requests.PreparedRequest) -> dict:
+        """
+        Returns the next recorded interaction for a request. Raises a CassetteException if it was never recorded.
+
+        :param request:
+        :return:
+        """
+        key = request_key(request)
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                raise CassetteException(f"No recorded response for {request.method} {request.url} in {self.path}.")
+            interaction = interactions.popleft()
+            interactions.append(interaction)
+        return interaction
+
+    def delay(self, interaction: dict) -> float:
+        return self.latency if self.latency is not None else interaction['elapsed'] / self.speed
+
+    def adapter(self, adapter: BaseAdapter) -> BaseAdapter:
+        """
+        Returns the transport adapter for the mode: one that records what adapter sends and receives, or one that
+        replays without sending anything.
+
+        :param adapter: Adapter that sends the requests when recording.
+        :return:
+        """
+        return RecordingAdapter(self, adapter) if self.mode == RECORD else ReplayAdapter(self)
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Sends requests with another adapter and records every response to a Cassette.
+    """
+    def __init__(self, cassette: Cassette, adapter: BaseAdapter):
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        response = self.adapter.send(request, **kwargs)
+        # Reading the body here also times the transfer, which is part of what the replay reproduces.
+        response.content
+        self.cassette.record(request, response, time.perf_counter() - start)
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests from a Cassette. Nothing is sent over the network.
+    """
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        interaction = self.cassette.next_interaction(request)
+        delay = self.cassette.delay(interaction)
+        if delay > 0:
+            time.sleep(delay)
+
+        response = requests.Response()
+        response.status_code = interaction['status']
+        response.reason = interaction['reason']
+        response.headers = CaseInsensitiveDict(interaction['headers'])
+        response._content = interaction['body']
+        response._content_consumed = True
+        response._wire_bytes = len(interaction['body'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=delay)
+        response.connection = self
+        return response
+
+    def close(self) -> None:
+        pass
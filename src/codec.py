@@ -0,0 +1,83 @@
+import logging
+import zlib
+from pathlib import Path
+from typing import Iterable, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'DPZ'
+ZSTD = b'z'
+ZLIB = b'g'
+
+
+class Codec:
+    """
+    Compresses cache files. Uses zstd if the optional package zstandard is installed, otherwise zlib. Every compressed
+    blob starts with MAGIC and a codec byte, so files written with either codec, and uncompressed files from older
+    versions, can all be read back.
+
+    dataBlocks payloads repeat the same keys in every response, so a zstd dictionary trained on a sample of them (see
+    train_dictionary) compresses small responses much better. Blobs written with a dictionary need the same dictionary
+    to be read.
+
+    :param level: Compression level. Defaults to 3 for zstd and 6 for zlib.
+    :param dictionary_path: Path to a trained zstd dictionary. Used if the file exists and zstd is available.
+    """
+    def __init__(self, level: int = None, dictionary_path: Union[str, Path] = None):
+        self.log = logging.getLogger(__name__)
+        self.name = 'zstd' if zstandard is not None else 'zlib'
+        self.level = level if level is not None else (3 if zstandard is not None else 6)
+        self.dictionary = None
+
+        if zstandard is not None and dictionary_path is not None and Path(dictionary_path).exists():
+            self.dictionary = zstandard.ZstdCompressionDict(Path(dictionary_path).read_bytes())
+            self.log.debug(f"Using zstd dictionary {dictionary_path}.")
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compresses data with the available codec.
+
+        :param data:
+        :return:
+        """
+        if zstandard is None:
+            return MAGIC + ZLIB + zlib.compress(data, self.level)
+        compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+        return MAGIC + ZSTD + compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        """
+        Decompresses data written by compress. Data without the MAGIC prefix is returned as is.
+
+        :param data:
+        :return:
+        """
+        if not data.startswith(MAGIC):
+            return data
+        codec, payload = data[len(MAGIC):len(MAGIC) + 1], data[len(MAGIC) + 1:]
+        if codec == ZLIB:
+            return zlib.decompress(payload)
+        if codec == ZSTD:
+            if zstandard is None:
+                raise ValueError("Data is compressed with zstd, but zstandard is not installed.")
+            return zstandard.ZstdDecompressor(dict_data=self.dictionary).decompress(payload)
+        raise ValueError(f"Unknown codec {codec!r}.")
+
+    @staticmethod
+    def train_dictionary(samples: Iterable[bytes], path: Union[str, Path], size: int = 112640) -> None:
+        """
+        Trains a zstd dictionary on sample payloads, e.g. a few hundred raw dataBlocks responses, and saves it.
+
+        :param samples: Sample payloads.
+        :param path: File to save the dictionary to.
+        :param size: Dictionary size in bytes. Defaults to 110 KiB.
+        :return:
+        """
+        if zstandard is None:
+            raise ImportError("Training a dictionary requires zstandard: pip install zstandard")
+        dictionary = zstandard.train_dictionary(size, list(samples))
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_bytes(dictionary.as_bytes())
@@ -0,0 +1,89 @@
+import os
+import threading
+from pathlib import Path
+from typing import Union
+
+CONFIG_ENV_VAR = 'DIRECTPLUS_CONFIG'
+
+
+def find_project_root(start: Union[str, Path] = None) -> Path:
+    """
+    Returns the first directory at or above start (default: the working directory) that contains README.md.
+
+    :param start:
+    :return:
+    """
+    current_dir = Path(start or os.getcwd()).resolve()
+    for directory in (current_dir, *current_dir.parents):
+        if (directory / 'README.md').is_file():
+            return directory
+    raise FileNotFoundError(f"No project root with a README.md found above {current_dir}.")
+
+
+class Config:
+    """
+    Settings from environment.yaml, read on first access. Nothing is read when the package is imported, so worker
+    processes and tools that do not need credentials never touch the file.
+
+    The file is taken from the environment variable DIRECTPLUS_CONFIG if it is set, otherwise from the project root.
+    See environment.example.yaml for its layout. A missing file raises a FileNotFoundError on first access.
+
+    :param path: Path to the YAML file. Defaults to DIRECTPLUS_CONFIG or environment.yaml in the project root.
+    """
+    def __init__(self, path: Union[str, Path] = None):
+        self._path = Path(path) if path else None
+        self._data = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            self._path = Path(os.environ.get(CONFIG_ENV_VAR) or find_project_root() / 'environment.yaml')
+        return self._path
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    if not self.path.is_file():
+                        raise FileNotFoundError(
+                            f"No configuration file at {self.path}. Copy environment.example.yaml to environment.yaml "
+                            f"in the project root, or set {CONFIG_ENV_VAR} to the path of a configuration file.")
+                    import yaml
+                    with open(self.path, 'r') as stream:
+                        self._data = yaml.safe_load(stream) or {}
+        return self._data
+
+    @property
+    def credentials(self) -> dict:
+        return self.data.get('credentials')
+
+    @property
+    def logging(self) -> dict:
+        return self.data.get('logging')
+
+
+config = Config()
+_logging_configured = False
+
+
+def configure_logging(options: dict = None) -> None:
+    """
+    Configures logging once, with the given options or the 'logging' section of environment.yaml (see
+    custom_logging.logging_setup). Later calls do nothing.
+
+    :param options:
+    :return:
+    """
+    global _logging_configured
+    if _logging_configured:
+        return
+    from src.custom_logging import logging_setup
+    if options is None:
+        try:
+            options = config.logging
+        except FileNotFoundError:
+            options = None
+    logging_setup(options)
+    _logging_configured = True
@@ -1,29 +1,119 @@
+import atexit
 import logging
-import logging.config
 from pathlib import Path
 
 
+TRACE = 5
+VERBOSE = 15
+IMPORTANT = 25
+
+
+def _logger_method(level: int):
+    def log_func(self, message, *args, **kwargs):
+        if self.isEnabledFor(level):
+            self._log(level, message, args, **kwargs)
+    return log_func
+
+
+def _adapter_method(level: int):
+    def log_func(self, message, *args, **kwargs):
+        self.log(level, message, *args, **kwargs)
+    return log_func
+
+
 def add_log_levels():
     new_levels = {
-        'TRACE': 5,
-        'VERBOSE': 15,
-        'IMPORTANT': 25
+        'TRACE': TRACE,
+        'VERBOSE': VERBOSE,
+        'IMPORTANT': IMPORTANT
     }
 
-    def log_func(self, message, *args, **kwargs):
-        if self.isEnabledFor(new_levels.get(message.upper(), 0)):
-            self._log(new_levels.get(message.upper(), 0), message, args, **kwargs)
-
+    # One method per level, so the level check is a single isEnabledFor call.
     for level, value in new_levels.items():
         logging.addLevelName(value, level)
-        setattr(logging.Logger, level.lower(), log_func)
-        setattr(logging.LoggerAdapter, level.lower(), log_func)
-
-
-def logging_setup():
+        setattr(logging.Logger, level.lower(), _logger_method(value))
+        setattr(logging.LoggerAdapter, level.lower(), _adapter_method(value))
+
+
+_listener = None
+
+
+def _start_queue_logging(queue_size: int) -> None:
+    """
+    Moves the handlers configured by dictconfig to a QueueListener thread. Every logger that had handlers gets a single
+    NonBlockingQueueHandler instead, so callers only enqueue records.
+    """
+    global _listener
+    import logging.handlers
+    import queue
+    from src.log_queue import NonBlockingQueueHandler
+
+    loggers = [logging.getLogger()] + [logging.getLogger(name) for name in dictconfig['loggers'] if name]
+    handlers = []
+    for logger in loggers:
+        for handler in logger.handlers:
+            if handler not in handlers:
+                handlers.append(handler)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    for logger in loggers:
+        if logger.handlers:
+            logger.handlers = [queue_handler]
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_queue_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# Registered after the logging module's own exit handler, so it runs first and flushes the queue.
+atexit.register(_stop_queue_logging)
+
+
+def _set_min_level(min_level: int = None) -> None:
+    """
+    Raises the level of this package's loggers to min_level, so their records below it are dropped before they are
+    created. Loggers of other packages and of the application keep their levels.
+    """
+    package = __name__.partition('.')[0]
+    logging.getLogger(package).setLevel(min_level or logging.NOTSET)
+    if min_level is None:
+        return
+    for name, logger in list(logging.root.manager.loggerDict.items()):
+        # Loggers without a level of their own inherit the level of the package logger.
+        if isinstance(logger, logging.Logger) and name.startswith(f'{package}.') and logger.level:
+            logger.setLevel(max(logger.level, min_level))
+
+
+def logging_setup(options: dict = None):
+    """
+    Configures logging from dictconfig.
+
+    :param options: Dictionary with the optional keys
+        queue: If True, records are put on a queue and formatted and written on a background thread. Defaults to False.
+        queue_size: Maximum number of queued records. Defaults to 10000.
+        min_level: Records of this package below this level, e.g. 'INFO', are dropped before a record is even
+            created. Loggers of other packages are not affected.
+    :return:
+    """
+    options = options or {}
+    _stop_queue_logging()
+    import logging.config
     add_log_levels()
+    Path(dictconfig['handlers']['file']['filename']).parent.mkdir(parents=True, exist_ok=True)
     logging.config.dictConfig(dictconfig)
 
+    min_level = options.get('min_level')
+    _set_min_level(logging.getLevelName(min_level) if isinstance(min_level, str) else min_level)
+    if options.get('queue', False):
+        _start_queue_logging(options.get('queue_size', 10000))
+
+
 class CustomFormatter(logging.Formatter):
     COLORS = {
         'TRACE': '\033[90m',    # Gray
@@ -123,6 +213,3 @@ dictconfig = {
         },
     }
 }
-
-
-
@@ -1,22 +1,28 @@
-import math
+import functools
+import logging
 import time
 
+from src.custom_logging import TRACE
+
 
 def timeit(func):
     """
-    Decorator function to time a function.
+    Decorator function to time a function. If INFO is disabled for the logger of the instance, the function is called
+    without timing it.
 
     :param func:
     :return:
     """
+    @functools.wraps(func)
     def timeit_wrapper(*args, **kwargs):
         self = args[0]
+        if not self.log.isEnabledFor(logging.INFO):
+            return func(*args, **kwargs)
         start = time.perf_counter()
         result = func(*args, **kwargs)
-        end = str(str(time.perf_counter() - start) + '000')[:6]
         self.log.info(
-            f"Time taken: {end} seconds to run {self.__class__.__name__}.{func.__name__}",
-            extra={'custom_funcName': func.__name__}
+            "Time taken: %.4f seconds to run %s.%s", time.perf_counter() - start, self.__class__.__name__,
+            func.__name__, extra={'custom_funcName': func.__name__}
         )
         return result
     return timeit_wrapper
@@ -25,13 +31,16 @@ def timeit(func):
 def log_args(func):
     """
     Decorator function to log the arguments of a function. One log row per argument. If the arguments are too long, they
-    will be truncated.
+    will be truncated. If TRACE is disabled for the logger of the instance, the arguments are not formatted at all.
 
     :param func:
     :return:
     """
+    @functools.wraps(func)
     def logargs_wrapper(*args, **kwargs):
         self = args[0]
+        if not self.log.isEnabledFor(TRACE):
+            return func(*args, **kwargs)
         for arg in args[1:]:
             arg = str(arg)[:100]
             self.log.trace(f"Argument: {arg}", extra={'custom_funcName': func.__name__})
@@ -39,4 +48,4 @@ def log_args(func):
             value = str(value)[:100]
             self.log.trace(f"Argument: {key}={value}", extra={'custom_funcName': func.__name__})
         return func(*args, **kwargs)
-    return logargs_wrapper
\ No newline at end of file
+    return logargs_wrapper
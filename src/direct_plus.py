@@ -1,20 +1,27 @@
 import base64
-import json
 import logging
-import math
-import time
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 import requests
-from requests import HTTPError
 
 # Import only the necessary exceptions from exceptions module
 from src.access_manager import AccessManager
+from src.block_cache import BlockCache
+from src.block_planner import BlockPlanner
+from src.budget import CostAwareScheduler
+from src.config import configure_logging
 from src.endpoints import EndpointFactory, Endpoint
 from src.decorators import log_args
+from src.family_tree import FamilyTreeCrawler, AncestryResolver
+from src.job import EnrichmentJob
+from src import json_backend
+from src.reference_data import ReferenceDataStore
+from src.refresh import IncrementalRefresher
 from src.request import DirectPlusRequest
-from src.exceptions import EmptySearchException
+from src.exceptions import EmptySearchException, DunsException
 from src.session import DirectPlusSession
+from src.transformer.projector import Projector
 
 
 class SearchCandidateCountException(Exception):
@@ -24,12 +31,14 @@ class SearchCandidateCountException(Exception):
 class DirectPlus:
     API_SPECS_DIR = Path(Path(__file__).parent / 'specs')
 
-    def __init__(self, api_credentials, *flags):
+    def __init__(self, api_credentials, *flags, session_options: dict = None):
         """
         Initializes the DirectPlus object. Raises a ValueError if the credentials are invalid.
         :param api_credentials:
         :param flags:
+        :param session_options: Connection pool and timeout options. See DirectPlusSession.
         """
+        configure_logging()
         self.log = logging.getLogger(__name__)
         self.endpoints = {}
         self.rate = '0.3'
@@ -41,9 +50,19 @@ class DirectPlus:
 
         self.key_64 = base64.b64encode(bytes(f"{self.key}:{self.secret}", 'utf-8')).decode('utf-8')
         self.flags = {flag: True for flag in flags if isinstance(flag, str)}
-        self.session = DirectPlusSession(self.key_64, self.flags)
+        self.session = DirectPlusSession(self.key_64, self.flags, session_options=session_options)
+        # Per-endpoint counts, latency histograms, bytes, cache hits and errors. See src/metrics.py.
+        self.metrics = self.session.metrics
+        # Per-phase timings of every request, reported to the hooks added with tracer.add_hook. See src/tracing.py.
+        self.tracer = self.session.tracer
+        # Spend against the daily and monthly limits of the session option budget, or None. See src/budget.py.
+        self.budget = self.session.budget
+        # Admission of requests by priority class and job of the session option scheduler, or None. See
+        # src/scheduler.py.
+        self.request_scheduler = self.session.scheduler
 
         self.access_manager = AccessManager(self.session, self.endpoints, **self.flags)
+        self.block_cache = BlockCache() if self.flags.get('BLOCK_CACHE', False) else None
 
     @log_args
     def _add_endpoint(self, endpoint: Endpoint):
@@ -84,8 +103,8 @@ class DirectPlus:
         :param file_path:
         :return:
         """
-        with open(file_path, 'r', encoding='UTF8') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            return json_backend.loads(f.read())
 
     @log_args
     def _validate_hex_64(self, string):
@@ -123,19 +142,149 @@ class DirectPlus:
         self._validate_secret_key(api_credentials.get('secret', ''), api_credentials.get('key', ''))
 
     @log_args
-    def enrich_duns(self, duns: str, blockIDs: str) -> requests.Response:
+    def enrich_duns(self, duns: str, blockIDs: str, fields: List[str] = None) -> dict:
         """
-        Returns all data available for a duns number.
+        Returns all data available for a duns number. If fields is provided, only those paths are extracted from the
+        raw response (see Projector) and returned as a flat dictionary, without decoding the whole response.
+
+        With the flag BLOCK_CACHE, blocks are cached one by one and only blocks that are not cached are requested.
 
         :param duns:
+        :param blockIDs:
+        :param fields: List of paths to extract, using the Flattener delimiter convention.
         :return:
         """
-        return self.call(
+        if self.block_cache is not None:
+            result = self._enrich_duns_block_cached(duns, blockIDs)
+            return Projector(fields).project(result) if fields else result
+
+        response = self.call(
             'dataBlocks',
             dunsNumber=duns,
             blockIDs=blockIDs
+        )
+        if fields:
+            with response:
+                return Projector(fields).project(response.content)
+        return response.json()
+
+    def _enrich_duns_block_cached(self, duns: str, blockIDs: str) -> dict:
+        """
+        Returns the requested blocks for a duns number, requesting only the blocks that are not in the block cache.
+
+        :param duns:
+        :param blockIDs:
+        :return:
+        """
+        block_ids = [block_id.strip() for block_id in blockIDs.split(',') if block_id.strip()]
+        entries = {block_id: self.block_cache.get(duns, block_id) for block_id in block_ids}
+        missing = [block_id for block_id, entry in entries.items() if entry is None]
+
+        if missing:
+            self.log.debug(f"Requesting {len(missing)} of {len(block_ids)} blocks for {duns}: {missing}")
+            response = self.call(
+                'dataBlocks',
+                dunsNumber=duns,
+                blockIDs=','.join(missing)
+            ).json()
+            entries.update(self.block_cache.store(duns, response, missing))
+
+        return self.block_cache.merge(duns, block_ids, entries)
+
+    @log_args
+    def plan_blocks(self, fields: List[str], min_levels: Dict[str, int] = None) -> str:
+        """
+        Returns the blockIDs for enrich_duns that deliver the given fields with the fewest blocks at the lowest entitled
+        levels. See BlockPlanner.
+
+        :param fields: Fields the job needs, e.g. ['organization.industryCodes'].
+        :param min_levels: Minimum level per block family name, e.g. {'companyinfo': 2}.
+        :return:
+        """
+        entitlements = None if self.flags.get('SKIP_ENTITLEMENT_CHECK', False) else self.access_manager.all_entitlements
+        return ','.join(BlockPlanner(entitlements).plan(fields, min_levels=min_levels))
+
+    @log_args
+    def enrich_many(self, duns: Iterable[str], blockIDs: str, fields: List[str] = None) -> Iterator[Tuple[str, dict]]:
+        """
+        Enriches a stream of duns numbers, e.g. from a DunsReader. Yields (duns, result) tuples one at a time. Duns
+        numbers that raise a DunsException are logged and skipped.
+
+        :param duns: Iterable of duns numbers.
+        :param blockIDs:
+        :param fields: List of paths to extract. See enrich_duns.
+        :return:
+        """
+        for duns_number in duns:
+            try:
+                yield duns_number, self.enrich_duns(duns_number, blockIDs, fields=fields)
+            except DunsException as e:
+                self.log.warning(f"Skipping duns {duns_number}: {e}")
+
+    @log_args
+    def scheduler(self) -> CostAwareScheduler:
+        """
+        Returns a scheduler that enriches queued duns numbers by priority within the budget, degrading block levels
+        when the budget runs short. See CostAwareScheduler.
+
+        :return:
+        """
+        return CostAwareScheduler(self)
+
+    @log_args
+    def enrich_job(self, duns: Iterable[str], blockIDs: str, journal_path: str, output_path: str,
+                   fields: List[str] = None, max_attempts: int = 3) -> dict:
+        """
+        Enriches a stream of duns numbers as a resumable job. Results are written as JSON lines to output_path and
+        progress is journaled to journal_path. Running the job again with the same paths skips duns numbers that are
+        done or failed permanently and retries transient failures. See EnrichmentJob.
+
+        :param duns: Iterable of duns numbers.
+        :param blockIDs:
+        :param journal_path: Path to the checkpoint journal.
+        :param output_path: Path to the JSON lines output file.
+        :param fields: List of paths to extract. See enrich_duns.
+        :param max_attempts: Maximum number of attempts for transient errors.
+        :return: Number of duns numbers per outcome.
+        """
+        job = EnrichmentJob(self, journal_path, output_path, blockIDs, fields=fields, max_attempts=max_attempts)
+        return job.run(duns)
+
+    @log_args
+    def refresh_check(self, duns: str, productId: str, versionId: str, referenceDate: str) -> dict:
+        """
+        Returns whether the data of a product for a duns number has been updated after referenceDate (YYYY-MM-DD).
+
+        :param duns:
+        :param productId: E.g. 'companyinfo_L1'.
+        :param versionId: E.g. 'v1'.
+        :param referenceDate:
+        :return:
+        """
+        return self.call(
+            'refreshCheck',
+            dunsNumber=duns,
+            productId=productId,
+            versionId=versionId,
+            referenceDate=referenceDate
         ).json()
 
+    @log_args
+    def refresh_duns(self, duns: Iterable[str], blockIDs: str, store_path: str,
+                     fields: List[str] = None) -> Iterator[Tuple[str, dict]]:
+        """
+        Incrementally re-enriches a stream of duns numbers. Only duns numbers whose blocks changed since they were last
+        retrieved, according to refreshCheck, are enriched, and only for the changed blocks. Retrieval dates are kept
+        in store_path. See IncrementalRefresher.
+
+        :param duns: Iterable of duns numbers.
+        :param blockIDs:
+        :param store_path: Path to the file with the last retrieval date per duns number and block.
+        :param fields: List of paths to extract. See enrich_duns.
+        :return:
+        """
+        return IncrementalRefresher(self, store_path).refresh(duns, blockIDs, fields=fields)
+
     @log_args
     def call(self, endpoint_id: str, **kwargs) -> requests.Response:
         """
@@ -216,14 +365,82 @@ class DirectPlus:
         return self.call('familyTreeFull', duns=duns).json()
 
     @log_args
-    def get_category_codes(self, code: int) -> list:
+    def family_tree_crawler(self, duns: str, page_size: int = 1000, workers: int = 8, exclusionCriteria: str = None,
+                            build_index: bool = False) -> FamilyTreeCrawler:
+        """
+        Returns a crawler that streams all members of the full family tree of a duns number, fetching the pages
+        concurrently. Iterate over it to get the members. See FamilyTreeCrawler.
+
+        :param duns:
+        :param page_size: Number of members per page.
+        :param workers: Number of pages fetched concurrently.
+        :param exclusionCriteria: E.g. 'Branches'.
+        :param build_index: If True, the crawler builds a parent -> children index while streaming.
+        :return:
+        """
+        self.session.ensure_pool_size(workers)
+        return FamilyTreeCrawler(self, duns, page_size=page_size, workers=workers,
+                                 exclusion_criteria=exclusionCriteria, build_index=build_index)
+
+    @log_args
+    def resolve_ancestry(self, duns: Iterable[str], workers: int = 8) -> AncestryResolver:
+        """
+        Resolves the upward family trees of many duns numbers concurrently into a shared duns -> parent cache, fetching
+        each chain only once. See AncestryResolver.
+
+        :param duns: Iterable of duns numbers.
+        :param workers: Number of upward trees fetched concurrently.
+        :return:
+        """
+        self.session.ensure_pool_size(workers)
+        return AncestryResolver(self, workers=workers).resolve(duns)
+
+    @log_args
+    def get_category_codes(self, code: int, languageCode: int = None) -> list:
         """
         Returns a list of industry codes for a given code.
 
         :param code: Industry code type id.
+        :param languageCode: Language of the descriptions. Reference data category 3.
+        :return:
+        """
+        if languageCode is None:
+            return self.call('refdataCodes', id=code).json()
+        return self.call('refdataCodes', id=code, languageCode=languageCode).json()
+
+    @log_args
+    def get_categories(self) -> dict:
+        """
+        Returns all reference data categories.
+
+        :return:
+        """
+        return self.call('refdataCategories').json()
+
+    @log_args
+    def get_country(self, isoAlpha2Code: str) -> dict:
+        """
+        Returns the GENC country reference for an ISO alpha-2 country code.
+
+        :param isoAlpha2Code:
+        :return:
+        """
+        return self.call('refdataGENC', isoAlpha2Code=isoAlpha2Code).json()
+
+    @log_args
+    def reference_data(self, file_path: str, categories: List[int], language_codes: List[int] = None,
+                       ttl: int = 7 * 24 * 60 * 60) -> ReferenceDataStore:
+        """
+        Returns a local reference data store for the given categories. The categories are downloaded once and then
+        served from memory and from file_path. See ReferenceDataStore.
+
+        :param file_path: Path to the JSON file of the store.
+        :param categories: Category IDs.
+        :param language_codes: Language codes. Defaults to English.
+        :param ttl: Maximum age of the data in seconds.
         :return:
         """
-        return self.call('refdataCodes', id=code).json()
+        return ReferenceDataStore(self, file_path, categories, language_codes=language_codes, ttl=ttl)
 
     @log_args
     def match(self, **kwargs) -> requests.Response:
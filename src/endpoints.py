@@ -42,10 +42,12 @@ class ParameterValidator:
             'number': float
         }
 
-        if not isinstance(value, spec_types.get(spec.get('type', 'string'), str)):
-            raise ValueError(f"Parameter '{name}' must be of type '{spec.get('type', 'string')}', not {type(value)}.")
-
+        # Swagger specs put the type on the parameter, OpenAPI specs in its schema.
         spec_type = spec.get('type') or spec.get('schema', {}).get('type')
+
+        if not isinstance(value, spec_types.get(spec_type or 'string', str)):
+            raise ValueError(f"Parameter '{name}' must be of type '{spec_type or 'string'}', not {type(value)}.")
+
         if spec_type in ('integer', 'number'):
             if spec.get('minimum') is not None and value < spec.get('minimum'):
                 raise ValueError(f"Parameter '{name}' must be greater than or equal to {spec.get('minimum')}.")
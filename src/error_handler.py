@@ -2,22 +2,42 @@ import logging
 from typing import TYPE_CHECKING
 
 from src.exceptions import RequestPayloadException, AuthorizationError, DunsException, MatchException
+from src.response import DirectPlusResponse
 
 if TYPE_CHECKING:
     from requests import Response
 
 
 class ErrorHandler:
+    # Error envelopes are a few hundred bytes. A successful JSON body larger than this cannot be one.
+    ERROR_ENVELOPE_MAX_SIZE = 4096
+
     def __init__(self, response: 'Response') -> None:
         self._reason = None
         self._status_code = None
+        self.branch = None
         self.log = logging.getLogger(__name__)
-        self._response = response
+        self._response = DirectPlusResponse.wrap(response)
 
     @property
-    def response(self) -> 'Response':
+    def response(self) -> 'DirectPlusResponse':
         return self._response
 
+    @property
+    def body(self) -> dict:
+        """
+        The decoded response body, shared with the caller. Empty if the body is not a JSON object.
+        """
+        try:
+            body = self.response.json()
+        except ValueError:
+            return {}
+        return body if isinstance(body, dict) else {}
+
+    @property
+    def error(self) -> dict:
+        return self.body.get('error') or {}
+
     @property
     def status_code(self) -> int:
         if self._status_code is not None:
@@ -46,24 +66,35 @@ class ErrorHandler:
 
     @property
     def dnb_error_code(self) -> str:
-        return self.response.json().get('error', {}).get('errorCode', '')
+        return self.error.get('errorCode', '')
 
     @property
     def dnb_error_message(self) -> str:
-        return self.response.json().get('error', {}).get('errorMessage', '')
+        return self.error.get('errorMessage', '')
+
+    def _can_be_error_envelope(self) -> bool:
+        if 'json' not in self.response.headers.get('Content-Type', ''):
+            return False
+        return len(self.response.content) <= self.ERROR_ENVELOPE_MAX_SIZE
 
     def has_error(self) -> bool:
-        return self.status_code >= 400 or self.response.json().get('error', False)
+        if self.status_code >= 400:
+            return True
+        # Fast path: a successful response that cannot hold an error envelope is not decoded here at all.
+        if 200 <= self.status_code < 300 and not self._can_be_error_envelope():
+            return False
+        return bool(self.error)
 
     def handle_error(self) -> None:
         try:
             func_ = getattr(self, f"handle_{self.status_code}")
         except AttributeError:
             func_ = self.handle_
+        self.branch = func_.__name__
         func_()
 
     def handle_(self) -> None:
-        raise ValueError(f"{self.reason}: {self.response.json().get('error', {})}")
+        raise ValueError(f"{self.reason}: {self.error}")
 
     def handle_400(self) -> None:
         self.log.error(self.reason)
@@ -81,17 +112,17 @@ class ErrorHandler:
             raise DunsException(self.dnb_error_message)
         elif self.dnb_error_code == '20505':
             raise MatchException(self.dnb_error_message)
-        raise ValueError(f"{self.reason}: {self.response.json().get('error', {})}")
+        raise ValueError(f"{self.reason}: {self.error}")
 
     def handle_410(self) -> None:
-        if self.response.json().get('error', {}).get('errorCode') == '40002':
+        if self.error.get('errorCode') == '40002':
             raise DunsException(self.dnb_error_message)
-        raise ValueError(f"{self.reason}: {self.response.json().get('error', {})}")
+        raise ValueError(f"{self.reason}: {self.error}")
 
     def handle_500(self) -> None:
-        fault = self.response.json().get('error', {}).get('fault', {})
+        fault = self.error.get('fault', {})
         if fault.get('faultstring', '').startswith('Error parsing request payload'):
             self.status_code = 400
             self.reason = f'Request payload is malformed or empty.'
             self.handle_400()
-        raise ValueError(f"Internal server error: {self.response.json().get('error', {}).get('fault', {})}")
+        raise ValueError(f"Internal server error: {self.error.get('fault', {})}")
@@ -98,4 +98,48 @@ class MatchException(DirectPlusException):
 
 
 class XLSXExportError(RuntimeError):
-    pass
\ No newline at end of file
+    pass
+
+
+class ProjectorError(Exception):
+    pass
+
+
+class InputReaderError(DataException):
+    pass
+
+
+class JobException(DirectPlusException):
+    pass
+
+
+class RefreshException(DirectPlusException):
+    pass
+
+
+class FamilyTreeException(DirectPlusException):
+    pass
+
+
+class ReferenceDataException(DirectPlusException):
+    pass
+
+
+class BlockPlanException(DirectPlusException):
+    pass
+
+
+class CassetteException(DirectPlusException):
+    pass
+
+
+class BudgetExceededException(DirectPlusException):
+    pass
+
+
+class SchedulerQueueFullException(DirectPlusException):
+    pass
+
+
+class DeadlineExceededException(DirectPlusException):
+    pass
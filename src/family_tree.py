@@ -0,0 +1,264 @@
+import json
+import logging
+import math
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Tuple, Union
+
+from src.exceptions import FamilyTreeException, DunsException
+
+if TYPE_CHECKING:
+    from src.direct_plus import DirectPlus
+
+
+class FamilyTreeCrawler:
+    """
+    Retrieves a full family tree page by page and yields its members as a stream. The first page tells how many
+    members the tree has; the remaining pages are then fetched concurrently, at most workers at a time, and their
+    members are yielded in page order. Only the pages in flight are held in memory.
+
+    If build_index is True, a parent -> children index of duns numbers is built while the members are streamed and is
+    available in children once iteration has finished.
+
+    :param dp: DirectPlus instance.
+    :param duns: Duns number of any member of the tree.
+    :param page_size: Number of members per page. Defaults to 1000.
+    :param workers: Number of pages fetched concurrently. Defaults to 8.
+    :param exclusion_criteria: Passed to familyTreeFull as exclusionCriteria, e.g. 'Branches'.
+    :param build_index: If True, build the parent -> children index.
+    """
+    def __init__(self, dp: 'DirectPlus', duns: str, page_size: int = 1000, workers: int = 8,
+                 exclusion_criteria: str = None, build_index: bool = False):
+        self.log = logging.getLogger(__name__)
+
+        if not isinstance(page_size, int) or page_size < 1:
+            raise FamilyTreeException(f"page_size must be a positive integer, not {page_size}")
+        if not isinstance(workers, int) or workers < 1:
+            raise FamilyTreeException(f"workers must be a positive integer, not {workers}")
+
+        self.dp = dp
+        self.duns = duns
+        self.page_size = page_size
+        self.workers = workers
+        self.exclusion_criteria = exclusion_criteria
+        self.build_index = build_index
+
+        self.member_count = None
+        self.page_count = None
+        self.global_ultimate_duns = None
+        self.children: Dict[str, List[str]] = {}
+
+    def _page(self, page_number: int) -> dict:
+        parameters = {
+            'duns': self.duns,
+            'page[size]': self.page_size,
+            'page[number]': page_number,
+        }
+        if self.exclusion_criteria is not None:
+            parameters['exclusionCriteria'] = self.exclusion_criteria
+        self.log.debug(f"Getting page {page_number} of the family tree of {self.duns}.")
+        return self.dp.call('familyTreeFull', **parameters).json()
+
+    def _index(self, members: List[dict]) -> None:
+        for member in members:
+            parent = member.get('corporateLinkage', {}).get('parent', {}).get('duns')
+            if parent is not None:
+                self.children.setdefault(parent, []).append(member.get('duns'))
+
+    def _members(self, page: dict) -> List[dict]:
+        members = page.get('familyTreeMembers') or []
+        if self.build_index:
+            self._index(members)
+        return members
+
+    def __iter__(self) -> Iterator[dict]:
+        first_page = self._page(1)
+        self.global_ultimate_duns = first_page.get('globalUltimateDuns')
+        self.member_count = first_page.get('globalUltimateFamilyTreeMembersCount', 0)
+        if self.exclusion_criteria is not None:
+            self.member_count -= first_page.get('branchesExcludedMembersCount') or 0
+        self.page_count = max(1, math.ceil(self.member_count / self.page_size))
+        self.log.info(f"Family tree of {self.duns} has {self.member_count} members on {self.page_count} pages.")
+
+        yield from self._members(first_page)
+        del first_page
+
+        if self.page_count == 1:
+            return
+
+        pages = iter(range(2, self.page_count + 1))
+        in_flight = deque()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for page_number in pages:
+                in_flight.append(executor.submit(self._page, page_number))
+                if len(in_flight) >= self.workers:
+                    break
+
+            while in_flight:
+                page = in_flight.popleft().result()
+                next_page_number = next(pages, None)
+                if next_page_number is not None:
+                    in_flight.append(executor.submit(self._page, next_page_number))
+                yield from self._members(page)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class AncestryResolver:
+    """
+    Resolves the upward family trees of many duns numbers into one shared duns -> parent cache. Every upward tree
+    returns the whole chain up to the global ultimate, so each member of that chain is cached and duns numbers that are
+    already known are never fetched again. Portfolios are resolved concurrently.
+
+    Once resolved, questions like "what is the global ultimate of X" are answered locally from the cache. The cache can
+    be saved to and loaded from a JSON file, or exported as a compact parent-pointer array.
+
+    :param dp: DirectPlus instance.
+    :param workers: Number of upward trees fetched concurrently. Defaults to 8.
+    """
+    DOMESTIC_ULTIMATE_CODE = 12774
+
+    def __init__(self, dp: 'DirectPlus' = None, workers: int = 8):
+        self.log = logging.getLogger(__name__)
+        if not isinstance(workers, int) or workers < 1:
+            raise FamilyTreeException(f"workers must be a positive integer, not {workers}")
+
+        self.dp = dp
+        self.workers = workers
+        self.parents: Dict[str, Union[str, None]] = {}
+        self.domestic_ultimates = set()
+        self.failed = set()
+        self.fetched = 0
+        self._lock = threading.Lock()
+
+    def _add_chain(self, response: dict) -> None:
+        with self._lock:
+            for member in response.get('familyTreeMembers') or []:
+                linkage = member.get('corporateLinkage', {})
+                duns = member.get('duns')
+                parent = linkage.get('parent', {}).get('duns')
+                self.parents[duns] = parent if parent != duns else None
+                roles = {role.get('dnbCode') for role in linkage.get('familytreeRolesPlayed') or []}
+                if self.DOMESTIC_ULTIMATE_CODE in roles:
+                    self.domestic_ultimates.add(duns)
+
+    def _fetch(self, duns: str) -> None:
+        # An earlier chain may have covered this duns number while it was queued.
+        if duns in self.parents:
+            return
+        try:
+            response = self.dp.upward_family_tree(duns)
+        except DunsException as e:
+            self.log.warning(f"Could not resolve upward family tree of {duns}: {e}")
+            with self._lock:
+                self.failed.add(duns)
+            return
+
+        self._add_chain(response)
+        with self._lock:
+            self.fetched += 1
+            # Standalone entities have no family tree members; they are their own global ultimate.
+            self.parents.setdefault(duns, None)
+
+    def resolve(self, duns: Iterable[str]) -> 'AncestryResolver':
+        """
+        Fetches the upward family trees of all duns numbers that are not known yet.
+
+        :param duns: Iterable of duns numbers.
+        :return: self
+        """
+        if self.dp is None:
+            raise FamilyTreeException("A DirectPlus instance is needed to resolve family trees.")
+
+        queued = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = deque()
+            for duns_number in duns:
+                if duns_number in self.parents or duns_number in queued or duns_number in self.failed:
+                    continue
+                queued.add(duns_number)
+                futures.append(executor.submit(self._fetch, duns_number))
+                # Bound the number of queued tasks so huge portfolios are not all submitted at once.
+                while len(futures) >= self.workers * 4:
+                    futures.popleft().result()
+            for future in futures:
+                future.result()
+
+        self.log.info(f"Fetched {self.fetched} upward family trees, {len(self.parents)} duns numbers known.")
+        return self
+
+    def _ancestors(self, duns: str) -> Iterator[str]:
+        seen = set()
+        while duns is not None and duns not in seen:
+            seen.add(duns)
+            yield duns
+            duns = self.parents.get(duns)
+
+    def global_ultimate(self, duns: str) -> Union[str, None]:
+        """
+        Returns the global ultimate of a duns number, or None if the duns number is not known.
+
+        :param duns:
+        :return:
+        """
+        if duns not in self.parents:
+            return None
+        ultimate = None
+        for ultimate in self._ancestors(duns):
+            pass
+        return ultimate
+
+    def domestic_ultimate(self, duns: str) -> Union[str, None]:
+        """
+        Returns the closest domestic ultimate at or above a duns number, or None if there is none.
+
+        :param duns:
+        :return:
+        """
+        for ancestor in self._ancestors(duns):
+            if ancestor in self.domestic_ultimates:
+                return ancestor
+        return None
+
+    def as_arrays(self) -> Tuple[List[str], array]:
+        """
+        Returns the cache as a list of duns numbers and a parent-pointer array. parent_index[i] is the position of the
+        parent of duns[i] in the list, or -1 for a global ultimate.
+
+        :return:
+        """
+        duns = list(self.parents)
+        position = {d: i for i, d in enumerate(duns)}
+        parent_index = array('l', (position.get(self.parents[d], -1) for d in duns))
+        return duns, parent_index
+
+    def save(self, file_path: Union[str, Path]) -> None:
+        """
+        Saves the cache to a JSON file.
+
+        :param file_path:
+        :return:
+        """
+        with open(file_path, 'w', encoding='UTF8') as f:
+            json.dump({'parents': self.parents, 'domestic_ultimates': sorted(self.domestic_ultimates)}, f)
+
+    @classmethod
+    def load(cls, file_path: Union[str, Path], dp: 'DirectPlus' = None, workers: int = 8) -> 'AncestryResolver':
+        """
+        Loads a cache saved with save.
+
+        :param file_path:
+        :param dp:
+        :param workers:
+        :return:
+        """
+        resolver = cls(dp, workers=workers)
+        with open(file_path, 'r', encoding='UTF8') as f:
+            data = json.load(f)
+        resolver.parents = data.get('parents', {})
+        resolver.domestic_ultimates = set(data.get('domestic_ultimates', []))
+        return resolver
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import ssl
+import threading
+from typing import Dict, Tuple, Union
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import DEFAULT_CA_BUNDLE_PATH, get_encoding_from_headers, select_proxy
+
+try:
+    import httpx
+    import h2  # noqa: F401 httpx needs it for http2=True
+except ImportError:
+    httpx = None
+
+
+class Http2Adapter(BaseAdapter):
+    """
+    Transport adapter that sends the requests of a requests.Session over HTTP/2, using httpx. Concurrent requests from
+    many threads are multiplexed as streams over a few connections instead of needing one connection each.
+
+    The protocol is negotiated with ALPN, so servers that do not speak HTTP/2 are used over HTTP/1.1 transparently.
+    Over plain http, HTTP/2 is only used with prior_knowledge.
+
+    The verify, cert and proxies settings of the session are honoured like requests does: every combination of TLS
+    settings and proxy gets its own client. Responses are read in full, so requests with stream=True are sent with the
+    fallback adapter, over HTTP/1.1, instead.
+
+    Requires the optional package httpx[http2]; check Http2Adapter.available() before creating one.
+
+    :param max_connections: Maximum number of connections. Defaults to 10.
+    :param prior_knowledge: Speak HTTP/2 without negotiation (h2c), e.g. for a local stub server. Defaults to False.
+    :param keepalive_expiry: Seconds an idle connection is kept open. Defaults to 60.
+    :param fallback: Adapter for streamed requests. Closed with this adapter. Defaults to a new HTTPAdapter.
+    """
+    def __init__(self, max_connections: int = 10, prior_knowledge: bool = False, keepalive_expiry: float = 60,
+                 fallback: BaseAdapter = None):
+        super().__init__()
+        if not self.available():
+            raise ImportError("The HTTP/2 transport requires httpx[http2]: pip install 'httpx[http2]'")
+        self.log = logging.getLogger(__name__)
+        self.fallback = fallback if fallback is not None else HTTPAdapter()
+        self._prior_knowledge = prior_knowledge
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                    keepalive_expiry=keepalive_expiry)
+        self._clients: Dict[Tuple, 'httpx.AsyncClient'] = {}
+        self._clients_lock = threading.Lock()
+
+        # The synchronous httpx client can hand out the same HTTP/2 stream ID to two threads. All requests therefore
+        # run on one event loop thread with the async client; the calling threads wait for their own result.
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='Http2Adapter', daemon=True)
+        self._thread.start()
+        self.client = self._client(True, None, None)
+
+    @staticmethod
+    def _ssl_context(verify: Union[bool, str], cert: Union[str, Tuple[str, str], None]) -> ssl.SSLContext:
+        """
+        Returns the SSL context for the verify and cert arguments of requests.
+        """
+        if verify is False:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        elif verify is True:
+            context = ssl.create_default_context(cafile=DEFAULT_CA_BUNDLE_PATH)
+        elif os.path.isdir(verify):
+            context = ssl.create_default_context(capath=verify)
+        else:
+            context = ssl.create_default_context(cafile=verify)
+        if isinstance(cert, tuple):
+            context.load_cert_chain(*cert)
+        elif cert:
+            context.load_cert_chain(cert)
+        return context
+
+    async def _create_client(self, verify: Union[bool, str], cert, proxy: Union[str, None]) -> 'httpx.AsyncClient':
+        # requests has already applied the environment (proxy variables, REQUESTS_CA_BUNDLE) to the arguments.
+        return httpx.AsyncClient(http1=not self._prior_knowledge, http2=True, limits=self._limits,
+                                 verify=self._ssl_context(verify, cert), proxy=proxy, trust_env=False)
+
+    def _client(self, verify: Union[bool, str], cert, proxy: Union[str, None]) -> 'httpx.AsyncClient':
+        key = (verify, cert, proxy)
+        with self._clients_lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self._run(self._create_client(verify, cert, proxy))
+                self.log.debug(f"Created HTTP/2 client for verify={verify}, cert={cert}, proxy={proxy}.")
+        return client
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    @staticmethod
+    def available() -> bool:
+        return httpx is not None
+
+    @staticmethod
+    def _timeout(timeout: Union[float, tuple, None]) -> 'httpx.Timeout':
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(timeout)
+
+    def send(self, request: requests.PreparedRequest, stream=False, timeout=None, verify=True, cert=None,
+             proxies=None) -> requests.Response:
+        if stream:
+            return self.fallback.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert,
+                                      proxies=proxies)
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        client = self._client(verify, cert, select_proxy(request.url, proxies))
+        try:
+            response = self._run(client.request(
+                request.method,
+                request.url,
+                headers=request.headers,
+                content=request.body,
+                timeout=self._timeout(timeout),
+            ))
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(e, request=request)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        self.log.trace("%s %s over %s", request.method, request.url, response.http_version)
+        return self.build_response(request, response)
+
+    def build_response(self, request: requests.PreparedRequest, httpx_response: 'httpx.Response') -> requests.Response:
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.reason = httpx_response.reason_phrase
+        response.headers = CaseInsensitiveDict(httpx_response.headers)
+        # httpx has already read and decompressed the body.
+        response._content = httpx_response.content
+        response._content_consumed = True
+        response._wire_bytes = httpx_response.num_bytes_downloaded
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = httpx_response.elapsed
+        response.connection = self
+        return response
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        self.fallback.close()
+        for client in self._clients.values():
+            self._run(client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,259 @@
+import csv
+import hashlib
+import json
+import logging
+import math
+import re
+from pathlib import Path
+from typing import Iterator, Union
+
+from src.exceptions import InputReaderError
+
+_DUNS_RE = re.compile(r'[0-9]{1,9}')
+_DUNS_SEPARATORS = str.maketrans('', '', '- ')
+
+
+class SeenSet:
+    """
+    Exact duplicate filter backed by a set. DUNS numbers are stored as integers to keep the per-entry cost low.
+    """
+    def __init__(self):
+        self._seen = set()
+
+    def add(self, key) -> bool:
+        """
+        Adds a key. Returns True if the key was not seen before.
+
+        :param key:
+        :return:
+        """
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class BloomFilter:
+    """
+    Probabilistic duplicate filter with a fixed memory footprint. A key that was never added can be reported as seen
+    with a probability of roughly error_rate, so a small share of unique keys may be dropped. Keys that were added are
+    always reported as seen.
+
+    :param capacity: Expected number of unique keys.
+    :param error_rate: Acceptable false positive rate at capacity. Defaults to 0.001.
+    """
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if not isinstance(capacity, int) or capacity < 1:
+            raise InputReaderError(f"capacity must be a positive integer, not {capacity}")
+        if not 0 < error_rate < 1:
+            raise InputReaderError(f"error_rate must be between 0 and 1, not {error_rate}")
+
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def _positions(self, key) -> Iterator[int]:
+        digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, key) -> bool:
+        """
+        Adds a key. Returns True if the key was (probably) not seen before.
+
+        :param key:
+        :return:
+        """
+        is_new = False
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                is_new = True
+        if is_new:
+            self._count += 1
+        return is_new
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def normalize_duns(value) -> Union[str, None]:
+    """
+    Normalizes a DUNS number to a 9 character zero-padded string. Dashes and spaces are removed. Returns None if the
+    value is not a valid DUNS number.
+
+    :param value:
+    :return:
+    """
+    if value is None:
+        return None
+    value = str(value).strip().translate(_DUNS_SEPARATORS)
+    if not _DUNS_RE.fullmatch(value):
+        return None
+    return value.zfill(9)
+
+
+class RecordReader:
+    """
+    Streams rows from a CSV, TSV or JSONL file. Rows are read one at a time so memory use does not depend on the size
+    of the file. CSV and TSV rows are lists, or dictionaries if the file has a header. JSONL rows are dictionaries.
+
+    Every pass over the file starts with an empty duplicate filter and zeroed counts, so a reader can be iterated more
+    than once.
+
+    :param file_path: Path to the input file.
+    :param file_format: 'csv', 'tsv' or 'jsonl'. Inferred from the file suffix if None.
+    :param delimiter: Column delimiter for csv files. Defaults to ',' for csv and tab for tsv.
+    :param has_header: If True, the first row of a csv/tsv file is used as column names.
+    :param encoding: File encoding. Defaults to UTF8.
+    :param dedup: Duplicate filter to use. 'bloom' for a filter of fixed size, about 18 MB with the default capacity and
+    error rate, that may drop roughly bloom_error_rate of the unique records once bloom_capacity is reached. 'set' for
+    an exact filter that grows with the input, about 70 bytes per unique DUNS number (700 MB for ten million) and
+    more for match records. None to keep duplicates. Defaults to 'bloom'.
+    :param bloom_capacity: Expected number of unique records when dedup is 'bloom'. Defaults to 10 million.
+    :param bloom_error_rate: False positive rate when dedup is 'bloom'. Defaults to 0.001.
+    """
+    FORMATS = ('csv', 'tsv', 'jsonl')
+
+    def __init__(self, file_path: Union[str, Path], file_format: str = None, delimiter: str = None,
+                 has_header: bool = False, encoding: str = 'UTF8', dedup: Union[str, None] = 'bloom',
+                 bloom_capacity: int = 10_000_000, bloom_error_rate: float = 0.001):
+        self.log = logging.getLogger(__name__)
+        self.file_path = Path(file_path)
+        self.file_format = (file_format or self.file_path.suffix.lstrip('.')).lower()
+        if self.file_format not in self.FORMATS:
+            raise InputReaderError(f"File format must be one of {self.FORMATS}, not '{self.file_format}'.")
+
+        self.delimiter = delimiter or ('\t' if self.file_format == 'tsv' else ',')
+        self.has_header = has_header
+        self.encoding = encoding
+
+        if dedup not in ('set', 'bloom', None):
+            raise InputReaderError(f"dedup must be 'set', 'bloom' or None, not '{dedup}'.")
+        self.dedup = dedup
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self._seen = self._new_filter()
+
+        self.rows_read = 0
+        self.invalid = 0
+        self.duplicates = 0
+
+    def _new_filter(self) -> Union[SeenSet, BloomFilter, None]:
+        if self.dedup == 'set':
+            return SeenSet()
+        if self.dedup == 'bloom':
+            return BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+        return None
+
+    def _reset(self) -> None:
+        if self._seen is not None and len(self._seen):
+            self._seen = self._new_filter()
+        self.rows_read = 0
+        self.invalid = 0
+        self.duplicates = 0
+
+    def rows(self) -> Iterator[Union[list, dict]]:
+        """
+        Yields the rows of the file. Starts a new pass: the duplicate filter and the counts are reset.
+
+        :return:
+        """
+        self._reset()
+        with open(self.file_path, 'r', encoding=self.encoding, newline='') as f:
+            if self.file_format == 'jsonl':
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        self.log.debug(f"Skipping line {line_number}: not valid JSON.")
+                        self.invalid += 1
+                        continue
+                    self.rows_read += 1
+                    yield row
+            elif self.has_header:
+                for row in csv.DictReader(f, delimiter=self.delimiter):
+                    self.rows_read += 1
+                    yield row
+            else:
+                for row in csv.reader(f, delimiter=self.delimiter):
+                    self.rows_read += 1
+                    yield row
+
+    def _value(self, row: Union[list, dict], column: Union[int, str]):
+        try:
+            return row[column]
+        except (IndexError, KeyError, TypeError):
+            return None
+
+    def _is_new(self, key) -> bool:
+        if self._seen is None or self._seen.add(key):
+            return True
+        self.duplicates += 1
+        return False
+
+
+class DunsReader(RecordReader):
+    """
+    Streams normalized, validated and deduplicated DUNS numbers from a CSV, TSV or JSONL file. Invalid values and
+    duplicates are skipped and counted in invalid and duplicates.
+
+    :param file_path: Path to the input file.
+    :param column: Column index or header name (csv/tsv), or key (jsonl) holding the DUNS number. Defaults to 0.
+    :param kwargs: Passed on to RecordReader.
+    """
+    def __init__(self, file_path: Union[str, Path], column: Union[int, str] = 0, **kwargs):
+        if isinstance(column, str) and kwargs.get('file_format', Path(file_path).suffix.lstrip('.')) != 'jsonl':
+            kwargs.setdefault('has_header', True)
+        super().__init__(file_path, **kwargs)
+        self.column = column
+
+    def __iter__(self) -> Iterator[str]:
+        for row in self.rows():
+            duns = normalize_duns(self._value(row, self.column))
+            if duns is None:
+                self.invalid += 1
+                continue
+            if self._is_new(int(duns)):
+                yield duns
+
+
+class MatchRecordReader(RecordReader):
+    """
+    Streams match criteria from a CSV, TSV or JSONL file. Each record is a dictionary of IDRCleanseMatch parameters
+    that can be passed to DirectPlus.match. Empty values are left out and records without any value are skipped.
+
+    :param file_path: Path to the input file.
+    :param columns: Mapping of match parameter name to column index, header name or jsonl key.
+    :param kwargs: Passed on to RecordReader.
+    """
+    def __init__(self, file_path: Union[str, Path], columns: dict, **kwargs):
+        if not columns:
+            raise InputReaderError("columns must map at least one match parameter to a column.")
+        if any(isinstance(c, str) for c in columns.values()):
+            kwargs.setdefault('has_header', True)
+        super().__init__(file_path, **kwargs)
+        self.columns = columns
+
+    def __iter__(self) -> Iterator[dict]:
+        for row in self.rows():
+            record = {}
+            for parameter, column in self.columns.items():
+                value = self._value(row, column)
+                if value is not None and str(value).strip() != '':
+                    record[parameter] = str(value).strip()
+            if not record:
+                self.invalid += 1
+                continue
+            if self._is_new(tuple(sorted(record.items()))):
+                yield record
+
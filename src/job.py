@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Union
+
+from src.exceptions import DunsException, RequestPayloadException, JobException
+
+if TYPE_CHECKING:
+    from src.direct_plus import DirectPlus
+
+
+class CheckpointJournal:
+    """
+    Append-only journal of processed duns numbers. Each line records the outcome of one attempt and the size of the
+    output file after it. Every write is flushed and synced to disk, so the journal survives a crash at any point.
+    A line that was only partly written when the process died is ignored when the journal is loaded.
+
+    :param file_path: Path to the journal file.
+    """
+    OK = 'ok'
+    PERMANENT = 'permanent'
+    ERROR = 'error'
+
+    def __init__(self, file_path: Union[str, Path]):
+        self.log = logging.getLogger(__name__)
+        self.file_path = Path(file_path)
+        self.entries = {}
+        self.output_offset = 0
+        self._file = None
+
+        if self.file_path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.file_path, 'r', encoding='UTF8') as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    self.log.warning(f"Ignoring unreadable journal line {line_number} in {self.file_path}.")
+                    continue
+                self.entries[entry.get('duns')] = entry
+                if entry.get('outcome') == self.OK:
+                    self.output_offset = entry.get('offset', self.output_offset)
+        self.log.info(f"Loaded {len(self.entries)} journal entries from {self.file_path}.")
+
+    def open(self) -> None:
+        if self._file is None:
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.file_path, 'a', encoding='UTF8')
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def attempts(self, duns: str) -> int:
+        return self.entries.get(duns, {}).get('attempts', 0)
+
+    def is_done(self, duns: str, max_attempts: int) -> bool:
+        """
+        Returns True if the duns number should not be processed again. That is the case if it succeeded, failed
+        permanently, or failed transiently max_attempts times.
+
+        :param duns:
+        :param max_attempts:
+        :return:
+        """
+        entry = self.entries.get(duns)
+        if entry is None:
+            return False
+        if entry.get('outcome') in (self.OK, self.PERMANENT):
+            return True
+        return entry.get('attempts', 0) >= max_attempts
+
+    def record(self, duns: str, outcome: str, offset: int, error: str = None, exception: str = None) -> None:
+        """
+        Appends an entry to the journal.
+
+        :param duns:
+        :param outcome: One of OK, PERMANENT or ERROR.
+        :param offset: Size of the output file after this duns number was processed.
+        :param error: Error message, if any.
+        :param exception: Name of the exception type, if any.
+        :return:
+        """
+        if outcome not in (self.OK, self.PERMANENT, self.ERROR):
+            raise JobException(f"Invalid outcome '{outcome}'.")
+        self.open()
+
+        entry = {
+            'duns': duns,
+            'outcome': outcome,
+            'offset': offset,
+            'attempts': self.attempts(duns) + 1,
+        }
+        if error is not None:
+            entry['error'] = error
+        if exception is not None:
+            entry['exception'] = exception
+
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self.entries[duns] = entry
+        if outcome == self.OK:
+            self.output_offset = offset
+
+    def summary(self) -> dict:
+        """
+        Returns the number of duns numbers per outcome, including outcomes this version does not know.
+
+        :return:
+        """
+        summary = {self.OK: 0, self.PERMANENT: 0, self.ERROR: 0}
+        for entry in self.entries.values():
+            outcome = entry.get('outcome')
+            summary[outcome] = summary.get(outcome, 0) + 1
+        return summary
+
+
+class EnrichmentJob:
+    """
+    Runs enrich_duns for a stream of duns numbers and writes each result as a JSON line to an output file. Progress is
+    recorded in a CheckpointJournal so that a job that stopped for any reason can be run again with the same input and
+    continues where it stopped:
+
+    * Duns numbers that succeeded are skipped.
+    * Duns numbers that raised a DunsException or RequestPayloadException failed permanently and are skipped.
+    * Duns numbers that failed with any other error are retried, up to max_attempts times in total.
+
+    The output file is truncated to the offset of the last journaled result before writing, so a result that was
+    written but not journaled when the process died is written again rather than twice. An output file that is
+    shorter than that offset, e.g. because it was deleted, raises a JobException: the journaled results are missing
+    from it and would not be written again.
+
+    :param dp: DirectPlus instance.
+    :param journal_path: Path to the checkpoint journal.
+    :param output_path: Path to the JSON lines output file.
+    :param blockIDs: Block IDs to request.
+    :param fields: List of paths to extract. See DirectPlus.enrich_duns.
+    :param max_attempts: Maximum number of attempts for transient errors. Defaults to 3.
+    """
+    PERMANENT_EXCEPTIONS = (DunsException, RequestPayloadException)
+
+    def __init__(self, dp: 'DirectPlus', journal_path: Union[str, Path], output_path: Union[str, Path],
+                 blockIDs: str, fields: List[str] = None, max_attempts: int = 3):
+        self.log = logging.getLogger(__name__)
+        if not isinstance(max_attempts, int) or max_attempts < 1:
+            raise JobException(f"max_attempts must be a positive integer, not {max_attempts}")
+
+        self.dp = dp
+        self.journal = CheckpointJournal(journal_path)
+        self.output_path = Path(output_path)
+        self.blockIDs = blockIDs
+        self.fields = fields
+        self.max_attempts = max_attempts
+
+    def _open_output(self):
+        size = self.output_path.stat().st_size if self.output_path.exists() else 0
+        if size < self.journal.output_offset:
+            raise JobException(
+                f"{self.output_path} has {size} bytes but the journal {self.journal.file_path} records "
+                f"{self.journal.output_offset}. Restore the output file, or delete the journal to start over.")
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        output = open(self.output_path, 'ab')
+        if size > self.journal.output_offset:
+            self.log.info(f"Truncating {self.output_path} to journaled offset {self.journal.output_offset}.")
+            output.truncate(self.journal.output_offset)
+            output.seek(self.journal.output_offset)
+        return output
+
+    def run(self, duns: Iterable[str]) -> dict:
+        """
+        Processes the duns numbers that are not done yet. Returns the journal summary.
+
+        :param duns: Iterable of duns numbers.
+        :return:
+        """
+        processed = 0
+        try:
+            with self._open_output() as output:
+                for duns_number in duns:
+                    if self.journal.is_done(duns_number, self.max_attempts):
+                        continue
+                    self._process(duns_number, output)
+                    processed += 1
+        finally:
+            self.journal.close()
+
+        summary = self.journal.summary()
+        self.log.info(f"Processed {processed} duns numbers. Journal: {summary}")
+        return summary
+
+    def _process(self, duns: str, output) -> None:
+        if self.journal.attempts(duns) > 0:
+            self.dp.metrics.inc('directplus_retries_total', source='job')
+        try:
+            result = self.dp.enrich_duns(duns, self.blockIDs, fields=self.fields)
+        except self.PERMANENT_EXCEPTIONS as e:
+            self.log.warning(f"Duns {duns} failed permanently: {e}")
+            self.journal.record(duns, CheckpointJournal.PERMANENT, output.tell(), error=str(e),
+                                exception=type(e).__name__)
+            return
+        except Exception as e:
+            self.log.warning(f"Duns {duns} failed (attempt {self.journal.attempts(duns) + 1}): {e}")
+            self.journal.record(duns, CheckpointJournal.ERROR, output.tell(), error=str(e),
+                                exception=type(e).__name__)
+            return
+
+        output.write((json.dumps({'duns': duns, 'result': result}) + '\n').encode('utf-8'))
+        output.flush()
+        os.fsync(output.fileno())
+        self.journal.record(duns, CheckpointJournal.OK, output.tell())
@@ -0,0 +1,58 @@
+import json
+import logging
+from typing import Any, Callable, Dict, Union
+
+log = logging.getLogger(__name__)
+
+
+def _stdlib_loads(data: Union[str, bytes]) -> Any:
+    return json.loads(data)
+
+
+def _available_backends() -> Dict[str, Callable[[Union[str, bytes]], Any]]:
+    """
+    Returns the installed parsers, fastest first. All of them raise a subclass of ValueError on invalid input.
+    """
+    backends = {}
+    try:
+        import orjson
+        backends['orjson'] = orjson.loads
+    except ImportError:
+        pass
+    try:
+        import ujson
+        backends['ujson'] = ujson.loads
+    except ImportError:
+        pass
+    backends['json'] = _stdlib_loads
+    return backends
+
+
+BACKENDS = _available_backends()
+BACKEND = next(iter(BACKENDS))
+_loads = BACKENDS[BACKEND]
+
+
+def set_backend(name: str) -> None:
+    """
+    Selects the parser used by loads. Raises a ValueError if it is not installed.
+
+    :param name: 'orjson', 'ujson' or 'json'.
+    :return:
+    """
+    global BACKEND, _loads
+    if name not in BACKENDS:
+        raise ValueError(f"JSON backend '{name}' is not installed. Available: {list(BACKENDS)}")
+    BACKEND = name
+    _loads = BACKENDS[name]
+    log.debug(f"Using JSON backend {name}.")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Decodes a JSON document with the selected backend. Bytes are passed through without decoding them to str first.
+
+    :param data:
+    :return:
+    """
+    return _loads(data)
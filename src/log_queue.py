@@ -0,0 +1,26 @@
+import logging
+import logging.handlers
+import queue
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on a bounded queue for a QueueListener, without formatting them in the calling thread. When the queue
+    is full, records below WARNING are dropped and counted in dropped; WARNING and above wait for space.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in this process, so the record can be handed over as is and formatted by the listener.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                self.dropped += 1
+                return
+            self.queue.put(record)
@@ -0,0 +1,209 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Latency buckets in seconds, from 5 ms to 60 s.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Metrics recorded by this package:
+#   directplus_requests_total{endpoint, status}             Requests sent, by HTTP status.
+#   directplus_request_seconds{endpoint}                    Latency of requests sent (histogram).
+#   directplus_request_bytes_total{endpoint}                Request body bytes sent.
+#   directplus_response_bytes_total{endpoint}               Response bytes received over the network.
+#   directplus_cache_total{endpoint, result}                Request cache lookups, result hit or miss.
+#   directplus_errors_total{endpoint, branch, exception}    Errors, by ErrorHandler branch (or 'transport').
+#   directplus_retries_total{source}                        Retried attempts.
+#   directplus_coalesced_total{endpoint}                    Requests answered by an identical request in flight.
+#   directplus_spend_total{endpoint}                        Cost of the calls sent, see CostModel.
+#   directplus_degraded_total{endpoint}                     Calls sent at lower block levels to fit the budget.
+#   directplus_scheduler_wait_seconds{priority}             Time requests waited for a RequestScheduler (histogram).
+#   directplus_scheduler_dropped_total{job, priority, reason}
+#                                                           Requests dropped at their deadline or refused by a full
+#                                                           queue.
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets. Quantiles are estimated by linear interpolation inside the bucket, which is
+    accurate to the bucket width and costs no memory per observation.
+
+    :param buckets: Upper bounds of the buckets, ascending. An overflow bucket is added.
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the estimated q-quantile, e.g. 0.95 for p95. 0.0 if nothing was observed.
+
+        :param q:
+        :return:
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+        }
+
+
+class Metrics:
+    """
+    In-process counters and histograms with labels, e.g. requests per endpoint. Safe to use from many threads.
+
+    Metrics are read with counter, histogram and snapshot, exported with to_prometheus, or pushed to callbacks
+    registered with add_hook. A hook is called as hook(kind, name, value, labels) for every inc and observe, on the
+    thread that recorded the value, so it must be fast.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._hooks: List[Callable[[str, str, float, dict], None]] = []
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> Tuple[str, Labels]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def add_hook(self, hook: Callable[[str, str, float, dict], None]) -> None:
+        self._hooks.append(hook)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        for hook in self._hooks:
+            hook('counter', name, value, labels)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+        for hook in self._hooks:
+            hook('histogram', name, value, labels)
+
+    @contextmanager
+    def time(self, name: str, **labels) -> Iterator[None]:
+        """
+        Observes the seconds spent in the with block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        """
+        Returns a counter. If no labels are given, the sum over all label values.
+
+        :param name:
+        :param labels:
+        :return:
+        """
+        with self._lock:
+            if labels:
+                return self._counters.get(self._key(name, labels), 0)
+            return sum(value for (counter_name, _), value in self._counters.items() if counter_name == name)
+
+    def histogram(self, name: str, **labels) -> dict:
+        """
+        Returns the summary (count, sum, p50, p95, p99, max) of a histogram, or None if nothing was observed.
+
+        :param name:
+        :param labels:
+        :return:
+        """
+        with self._lock:
+            histogram = self._histograms.get(self._key(name, labels))
+            return histogram.summary() if histogram is not None else None
+
+    def snapshot(self) -> dict:
+        """
+        Returns all counters and histogram summaries as {'counters': {...}, 'histograms': {...}}, keyed by name and
+        then by the label string, e.g. 'endpoint=dataBlocks'.
+
+        :return:
+        """
+        snapshot = {'counters': {}, 'histograms': {}}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                snapshot['counters'].setdefault(name, {})[self._label_string(labels)] = value
+            for (name, labels), histogram in self._histograms.items():
+                snapshot['histograms'].setdefault(name, {})[self._label_string(labels)] = histogram.summary()
+        return snapshot
+
+    @staticmethod
+    def _label_string(labels: Labels) -> str:
+        return ','.join(f"{key}={value}" for key, value in labels)
+
+    @staticmethod
+    def _prometheus_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ''
+        escaped = (
+            f'{key}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for key, value in pairs
+        )
+        return '{' + ','.join(escaped) + '}'
+
+    def to_prometheus(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+
+        :return:
+        """
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (counter_name, labels), value in self._counters.items():
+                    if counter_name == name:
+                        lines.append(f"{name}{self._prometheus_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (histogram_name, labels), histogram in self._histograms.items():
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{name}_bucket{self._prometheus_labels(labels, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{self._prometheus_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{self._prometheus_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,158 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Union
+
+from src.exceptions import ReferenceDataException
+
+if TYPE_CHECKING:
+    from src.direct_plus import DirectPlus
+
+
+class ReferenceDataStore:
+    """
+    Local store of reference data code tables. Selected categories are downloaded once with refdataCodes, kept in a
+    JSON file with a version stamp, and served from memory with dictionary lookups.
+
+    When the data is older than ttl, the next lookup starts a refresh on a background thread and keeps answering from
+    the current data until the new tables are swapped in.
+
+    :param dp: DirectPlus instance. Only needed to download; a store can be used offline from its file.
+    :param file_path: Path to the JSON file.
+    :param categories: Category IDs to download, e.g. 3599 for industry codes.
+    :param language_codes: Language codes (reference data category 3) to download. Defaults to [39] (English).
+    :param ttl: Maximum age of the data in seconds before it is refreshed. Defaults to 7 days.
+    """
+    def __init__(self, dp: Union['DirectPlus', None], file_path: Union[str, Path], categories: List[int],
+                 language_codes: List[int] = None, ttl: int = 7 * 24 * 60 * 60):
+        self.log = logging.getLogger(__name__)
+        self.dp = dp
+        self.file_path = Path(file_path)
+        self.categories = list(categories)
+        self.language_codes = list(language_codes or [39])
+        self.ttl = ttl
+
+        self.version = None
+        self.downloaded_at = 0.0
+        self._tables: Dict[tuple, Dict[str, str]] = {}
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+
+        if self.file_path.exists():
+            self.load()
+        if self._missing_tables():
+            self.refresh()
+
+    def _missing_tables(self) -> List[tuple]:
+        return [(category, language_code) for category in self.categories for language_code in self.language_codes
+                if (category, language_code) not in self._tables]
+
+    @property
+    def is_expired(self) -> bool:
+        return time.time() - self.downloaded_at > self.ttl
+
+    def load(self) -> None:
+        """
+        Loads the tables from the JSON file.
+
+        :return:
+        """
+        with open(self.file_path, 'r', encoding='UTF8') as f:
+            data = json.load(f)
+
+        self._tables = {
+            tuple(int(part) for part in key.split(':')): table for key, table in data.get('tables', {}).items()
+        }
+        self.version = data.get('version')
+        self.downloaded_at = data.get('downloaded_at', 0.0)
+        self.log.info(f"Loaded {len(self._tables)} reference data tables, version {self.version}.")
+
+    def save(self) -> None:
+        """
+        Writes the tables to the JSON file. The file is replaced atomically.
+
+        :return:
+        """
+        data = {
+            'version': self.version,
+            'downloaded_at': self.downloaded_at,
+            'tables': {f"{category}:{language}": table for (category, language), table in self._tables.items()},
+        }
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.file_path.with_suffix(self.file_path.suffix + '.tmp')
+        with open(temp_path, 'w', encoding='UTF8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.file_path)
+
+    def refresh(self) -> None:
+        """
+        Downloads all selected categories and languages, swaps them in and saves them.
+
+        :return:
+        """
+        if self.dp is None:
+            raise ReferenceDataException("A DirectPlus instance is needed to download reference data.")
+
+        tables = {}
+        for category in self.categories:
+            for language_code in self.language_codes:
+                response = self.dp.get_category_codes(category, languageCode=language_code)
+                table = {}
+                for code_table in response.get('codeTables') or []:
+                    for code in code_table.get('codeLists') or []:
+                        table[str(code.get('code'))] = code.get('description')
+                tables[(category, language_code)] = table
+
+        # A single assignment, so lookups on other threads see either the old or the new tables.
+        self._tables = tables
+        self.downloaded_at = time.time()
+        self.version = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.save()
+        self.log.info(f"Downloaded {len(tables)} reference data tables, version {self.version}.")
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            self.log.error(f"Background refresh of reference data failed: {e}")
+            # Wait a full ttl before trying again instead of retrying on every lookup.
+            self.downloaded_at = time.time()
+
+    def _refresh_if_expired(self) -> None:
+        if not self.is_expired or self.dp is None:
+            return
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_in_background, daemon=True)
+            self._refresh_thread.start()
+
+    def describe(self, category: int, code: Union[str, int], language_code: int = None) -> Union[str, None]:
+        """
+        Returns the description of a code, or None if the code is not in the table.
+
+        :param category: Category ID.
+        :param code: Code value.
+        :param language_code: Defaults to the first of language_codes.
+        :return:
+        """
+        self._refresh_if_expired()
+        table = self._tables.get((category, language_code or self.language_codes[0]))
+        if table is None:
+            raise ReferenceDataException(f"Category {category} in language {language_code} is not in the store.")
+        return table.get(str(code))
+
+    def table(self, category: int, language_code: int = None) -> Dict[str, str]:
+        """
+        Returns the code -> description table of a category.
+
+        :param category:
+        :param language_code:
+        :return:
+        """
+        self._refresh_if_expired()
+        return dict(self._tables.get((category, language_code or self.language_codes[0]), {}))
@@ -0,0 +1,154 @@
+import datetime
+import json
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Tuple, Union
+
+from src.exceptions import DunsException, RefreshException
+
+if TYPE_CHECKING:
+    from src.direct_plus import DirectPlus
+
+
+def split_block_id(block_id: str) -> Tuple[str, str]:
+    """
+    Splits a block ID into the productId and versionId used by refreshCheck, e.g. 'companyinfo_L1_v1' becomes
+    ('companyinfo_L1', 'v1').
+
+    :param block_id:
+    :return:
+    """
+    product_id, separator, version = block_id.rpartition('_v')
+    if not separator or not product_id or not version.isdigit():
+        raise RefreshException(f"Block ID '{block_id}' does not end with a version like '_v1'.")
+    return product_id, f"v{version}"
+
+
+class RefreshStore:
+    """
+    Keeps the date each block was last retrieved for each duns number, persisted as a JSON file.
+
+    :param file_path: Path to the JSON file. Created on the first save if it does not exist.
+    """
+    def __init__(self, file_path: Union[str, Path]):
+        self.log = logging.getLogger(__name__)
+        self.file_path = Path(file_path)
+        self._dates = {}
+        self._dirty = False
+
+        if self.file_path.exists():
+            with open(self.file_path, 'r', encoding='UTF8') as f:
+                self._dates = json.load(f)
+            self.log.debug(f"Loaded retrieval dates for {len(self._dates)} duns numbers.")
+
+    def last_retrieved(self, duns: str, block_id: str) -> Union[str, None]:
+        """
+        Returns the date (YYYY-MM-DD) the block was last retrieved for the duns number, or None if it never was.
+
+        :param duns:
+        :param block_id:
+        :return:
+        """
+        return self._dates.get(duns, {}).get(block_id)
+
+    def mark_retrieved(self, duns: str, block_ids: List[str], date: str = None) -> None:
+        """
+        Records that the blocks were retrieved for the duns number. Defaults to today's date (UTC).
+
+        :param duns:
+        :param block_ids:
+        :param date:
+        :return:
+        """
+        date = date or datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        self._dates.setdefault(duns, {}).update({block_id: date for block_id in block_ids})
+        self._dirty = True
+
+    def save(self) -> None:
+        """
+        Writes the store to disk. The file is replaced atomically so a crash never leaves a half-written store.
+
+        :return:
+        """
+        if not self._dirty:
+            return
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.file_path.with_suffix(self.file_path.suffix + '.tmp')
+        with open(temp_path, 'w', encoding='UTF8') as f:
+            json.dump(self._dates, f)
+        os.replace(temp_path, self.file_path)
+        self._dirty = False
+
+
+class IncrementalRefresher:
+    """
+    Re-enriches only the duns numbers and blocks that changed since they were last retrieved. For every block that was
+    retrieved before, refreshCheck is asked whether the entity has been updated after that date. enrich_duns is then
+    called once per duns number, for the changed and never retrieved blocks only.
+
+    :param dp: DirectPlus instance.
+    :param store_path: Path to the RefreshStore file.
+    :param save_every: Number of enriched duns numbers between saves of the store. Defaults to 100.
+    """
+    def __init__(self, dp: 'DirectPlus', store_path: Union[str, Path], save_every: int = 100):
+        self.log = logging.getLogger(__name__)
+        self.dp = dp
+        self.store = RefreshStore(store_path)
+        self.save_every = save_every
+
+    def stale_blocks(self, duns: str, block_ids: List[str]) -> List[str]:
+        """
+        Returns the blocks that have to be retrieved again for the duns number.
+
+        :param duns:
+        :param block_ids:
+        :return:
+        """
+        stale = []
+        for block_id in block_ids:
+            last_retrieved = self.store.last_retrieved(duns, block_id)
+            if last_retrieved is None:
+                stale.append(block_id)
+                continue
+
+            product_id, version_id = split_block_id(block_id)
+            response = self.dp.refresh_check(duns, product_id, version_id, last_retrieved)
+            if response.get('hasRefreshedData', True):
+                stale.append(block_id)
+        return stale
+
+    def refresh(self, duns: Iterable[str], blockIDs: str, fields: List[str] = None) -> Iterator[Tuple[str, dict]]:
+        """
+        Yields (duns, result) for every duns number with at least one stale block. The result only contains the stale
+        blocks. Duns numbers that raise a DunsException are logged and skipped.
+
+        :param duns: Iterable of duns numbers.
+        :param blockIDs: Comma separated block IDs.
+        :param fields: List of paths to extract. See DirectPlus.enrich_duns.
+        :return:
+        """
+        block_ids = [block_id.strip() for block_id in blockIDs.split(',') if block_id.strip()]
+        checked = 0
+        enriched = 0
+        try:
+            for duns_number in duns:
+                checked += 1
+                try:
+                    stale = self.stale_blocks(duns_number, block_ids)
+                    if not stale:
+                        continue
+                    result = self.dp.enrich_duns(duns_number, ','.join(stale), fields=fields)
+                except DunsException as e:
+                    self.log.warning(f"Skipping duns {duns_number}: {e}")
+                    continue
+
+                yield duns_number, result
+                # Only marked once the caller has taken the result, so an abandoned run fetches it again next time.
+                self.store.mark_retrieved(duns_number, stale)
+                enriched += 1
+                if enriched % self.save_every == 0:
+                    self.store.save()
+        finally:
+            self.store.save()
+            self.log.info(f"Checked {checked} duns numbers, re-enriched {enriched}.")
@@ -1,8 +1,10 @@
 import datetime
+import functools
 import hashlib
 import json
 import logging
 import pickle
+import time
 from pathlib import Path
 
 import requests
@@ -10,20 +12,34 @@ from typing import TYPE_CHECKING
 
 from requests import HTTPError
 
+from src.codec import Codec
+from src.custom_logging import TRACE
 from src.endpoints import Endpoint
 from src.error_handler import ErrorHandler
+from src.exceptions import DeadlineExceededException
+from src.response import DirectPlusResponse
+from src.scheduler import PRIORITY_NAMES, current_context
 from src.session import DirectPlusSession
+from src.single_flight import SingleFlightTimeout
 
 if TYPE_CHECKING:
     from src.access_manager import AccessManager
 
 
 class RequestHash:
+    # Cached responses are compressed. A zstd dictionary trained on dataBlocks payloads is used if it exists.
+    codec = Codec(dictionary_path=Path(__file__).parent / 'cache' / 'dataBlocks.dict')
+
     def __init__(self, method: str, **kwargs):
         self.log = logging.getLogger(__name__)
         self.method = method
         self.kwargs = kwargs
-        self.log.trace(f"Request hash path: {self.path.absolute()}")
+        if self.log.isEnabledFor(TRACE):
+            self.log.trace("Request hash path: %s", self.path.absolute())
+
+    @property
+    def key(self) -> str:
+        return self._generate_hash()
 
     def _generate_hash(self):
         m = hashlib.sha256()
@@ -33,9 +49,9 @@ class RequestHash:
             m.update(bytes(str(value), 'utf-8'))
         return m.hexdigest()
 
-    def cached_response(self) -> requests.Response:
+    def cached_response(self) -> DirectPlusResponse:
         with open(self.path, 'rb') as f:
-            return pickle.load(f)
+            return DirectPlusResponse.wrap(pickle.loads(self.codec.decompress(f.read())))
 
     @property
     def path(self) -> Path:
@@ -49,7 +65,7 @@ class RequestHash:
         if not self.path.parent.exists():
             self.path.parent.mkdir()
         with open(self.path, 'wb') as f:
-            pickle.dump(response, f)
+            f.write(self.codec.compress(pickle.dumps(response)))
 
 
 class DirectPlusRequest:
@@ -63,19 +79,80 @@ class DirectPlusRequest:
 
         self.session = session
         self.access_manager = access_manager
-        self.endpoint = endpoint
+        # Endpoint classes keep their parameters on the class. Work on a per-request subclass so that parameters of
+        # earlier requests, to this or any other endpoint, do not leak into this one.
+        self.endpoint = type(endpoint.__name__, (endpoint,), {'parameters': {}})
 
-        for key, value in kwargs.items():
-            self.endpoint.add_parameter(key, value)
+        self.trace = session.tracer.start(endpoint.name, duns=kwargs.get('duns') or kwargs.get('dunsNumber'))
+        try:
+            with self.trace.phase('validate'):
+                for key, value in kwargs.items():
+                    self.endpoint.add_parameter(key, value)
+                self._sends_correlation_id = self._add_correlation_id(kwargs)
+        except Exception:
+            # The request is never sent, so its trace ends here.
+            self.trace.end()
+            raise
+
+    def _add_correlation_id(self, kwargs: dict) -> bool:
+        """
+        Sends the correlation id of the trace as customerReference, if the endpoint accepts one and the caller did not
+        set it. Returns True if it was added.
+
+        :param kwargs:
+        :return:
+        """
+        if self.trace.correlation_id is None or 'customerReference' in kwargs:
+            return False
+        try:
+            self.endpoint.add_parameter('customerReference', self.trace.correlation_id)
+        except ValueError:
+            return False
+        return True
 
     @property
     def cached(self):
         return self._cached
 
-    def send(self) -> requests.Response:
+    def _hash_parameters(self, method_parameters: dict) -> dict:
+        # The correlation id differs for every request, so it is not part of the request hash.
+        if not self._sends_correlation_id:
+            return method_parameters
+        return {
+            key: {k: v for k, v in value.items() if k != 'customerReference'} if isinstance(value, dict) else value
+            for key, value in method_parameters.items()
+        }
+
+    def _attach_trace(self, response: DirectPlusResponse) -> DirectPlusResponse:
+        # Lets the response record decoding of its body as the json_decode phase of this request.
+        if self.trace.correlation_id is not None:
+            response._trace = self.trace
+        return response
+
+    def send(self) -> DirectPlusResponse:
+        """
+        Sends the request, or returns the cached response. If tracing is enabled, the phases validate, cache_check,
+        queue, token_refresh, http, error_handler and json_decode are reported to the hooks of session.tracer.
+        json_decode is only reported if the body is decoded, and the trace ends when it is, or when the response is
+        closed. Tracing does not decode a body the caller does not.
+
+        :return:
+        """
+        try:
+            response = self._send()
+        except BaseException:
+            self.trace.end()
+            raise
+        if not (response._trace is self.trace and response._take_trace()):
+            self.trace.end()
+        return response
+
+    def _send(self) -> DirectPlusResponse:
         self.log.debug(f"Sending {self.endpoint.method} request to {self.endpoint.url}")
-        method_function = getattr(self.session, self.endpoint.method.lower())
-        method_parameters = {'url': self.endpoint.url()}
+        # The access token is refreshed in its own traced phase, see _send_and_check.
+        method_function = functools.partial(self.session.fetch, self.endpoint.method)
+        # Responses of a stub server (see DirectPlusSession base_url) are cached apart from those of Direct+.
+        method_parameters = {'url': self.session.resolve_url(self.endpoint.url())}
         if self.endpoint.method == 'POST':
             method_parameters['json'] = self.endpoint.query_params()
         elif self.endpoint.method == 'GET':
@@ -83,18 +160,113 @@ class DirectPlusRequest:
 
         self.log.debug(f"Request parameters: {method_parameters.keys()}")
 
-        hash = RequestHash(method=self.endpoint.method, **method_parameters)
-        self.log.trace(f"Request hash: {hash}")
-        if hash.is_cached:
+        endpoint_name = self.endpoint.name
+        metrics = self.session.metrics
+        trace = self.trace
+        with trace.phase('cache_check'):
+            hash = RequestHash(method=self.endpoint.method, **self._hash_parameters(method_parameters))
+            self.log.trace("Request hash: %s", hash)
+            cached_response = hash.cached_response() if self.session.cache_responses and hash.is_cached else None
+        if cached_response is not None:
             self.log.debug(f"Request is cached. Returning cached response.")
-            return hash.cached_response()
-        else:
-            self.log.debug(f"Request is not cached. Sending request.")
-        response = method_function(**method_parameters)
-        eh = ErrorHandler(response)
-        if eh.has_error():
-            eh.handle_error()
-
-        hash.cache(response)
+            metrics.inc('directplus_cache_total', endpoint=endpoint_name, result='hit')
+            return self._attach_trace(cached_response)
+        self.log.debug(f"Request is not cached. Sending request.")
+        metrics.inc('directplus_cache_total', endpoint=endpoint_name, result='miss')
+
+        # Everything that is not a cache hit is admitted by the scheduler first, with the priority and deadline of its
+        # own request_context, and only then joins an identical request in flight. So a request never waits behind a
+        # queued request of another job or priority. A request that joins one in flight gives its slot back at once.
+        scheduler = self.session.scheduler
+        if scheduler is not None:
+            with trace.phase('queue'):
+                scheduler.acquire()
+        holds_slot = scheduler is not None
+
+        def release_slot() -> None:
+            nonlocal holds_slot
+            if holds_slot:
+                holds_slot = False
+                scheduler.release()
+
+        try:
+            if self.session.in_flight is None:
+                return self._send_uncached(hash, method_function, method_parameters)
+            # An identical request that is already in flight is not sent again; this one waits for its response, until
+            # its own deadline at the latest.
+            context = current_context()
+            try:
+                response, shared = self.session.in_flight.do(
+                    hash.key, lambda: self._send_uncached(hash, method_function, method_parameters),
+                    timeout=context.remaining(), join=release_slot)
+            except SingleFlightTimeout as e:
+                metrics.inc('directplus_scheduler_dropped_total', job=context.job,
+                            priority=PRIORITY_NAMES[context.priority], reason=DeadlineExceededException.__name__)
+                raise DeadlineExceededException(
+                    f"Request of job '{context.job}' waited for an identical request in flight until its deadline."
+                ) from e
+        finally:
+            release_slot()
+        if shared:
+            self.log.debug(f"Shared the response of an identical request in flight.")
+            metrics.inc('directplus_coalesced_total', endpoint=endpoint_name)
+            # Callers may change the decoded body in place, e.g. align_arrays, so every waiter decodes its own.
+            response = self._attach_trace(response.copy())
+        return response
+
+    def _send_uncached(self, hash: RequestHash, method_function, method_parameters: dict) -> DirectPlusResponse:
+        endpoint_name = self.endpoint.name
+        # An identical request may have finished and been cached since the cache was checked.
+        if self.session.cache_responses and hash.is_cached:
+            return self._attach_trace(hash.cached_response())
+
+        # Charged before sending, so concurrent requests cannot overspend, and refunded if the call fails.
+        budget = self.session.budget
+        cost = self.session.cost_model.cost(endpoint_name, self.endpoint.query_params().get('blockIDs'))
+        if budget is not None:
+            budget.charge(cost)
+        try:
+            response = self._send_and_check(method_function, method_parameters)
+        except Exception:
+            if budget is not None:
+                budget.refund(cost)
+            raise
+        self.session.metrics.inc('directplus_spend_total', cost, endpoint=endpoint_name)
+
+        if self.session.cache_responses:
+            hash.cache(response)
         return response
 
+    def _send_and_check(self, method_function, method_parameters: dict) -> DirectPlusResponse:
+        endpoint_name = self.endpoint.name
+        metrics = self.session.metrics
+        trace = self.trace
+        with trace.phase('token_refresh'):
+            self.session.refresh_access_token_if_necessary()
+
+        start = time.perf_counter()
+        try:
+            with trace.phase('http'):
+                # The timeout is not part of the request hash.
+                response = method_function(**method_parameters, timeout=self.session.timeout_for(endpoint_name))
+        except requests.exceptions.RequestException as e:
+            metrics.inc('directplus_errors_total', endpoint=endpoint_name, branch='transport',
+                        exception=type(e).__name__)
+            raise
+        metrics.observe('directplus_request_seconds', time.perf_counter() - start, endpoint=endpoint_name)
+        metrics.inc('directplus_requests_total', endpoint=endpoint_name, status=response.status_code)
+        metrics.inc('directplus_request_bytes_total', len(response.request.body or b''), endpoint=endpoint_name)
+        metrics.inc('directplus_response_bytes_total', response.wire_bytes or len(response.content),
+                    endpoint=endpoint_name)
+        self._attach_trace(response)
+
+        with trace.phase('error_handler'):
+            eh = ErrorHandler(response)
+            if eh.has_error():
+                try:
+                    eh.handle_error()
+                except Exception as e:
+                    metrics.inc('directplus_errors_total', endpoint=endpoint_name, branch=eh.branch,
+                                exception=type(e).__name__)
+                    raise
+        return response
@@ -0,0 +1,104 @@
+import time
+import weakref
+from typing import Union
+
+import requests
+
+from src import json_backend
+
+_NOT_DECODED = object()
+
+
+class DirectPlusResponse(requests.Response):
+    """
+    Response that decodes its JSON body at most once. The ErrorHandler and the caller share the decoded body, so a
+    large dataBlocks payload is not parsed again for every .json() call. The body is decoded from the raw bytes with
+    the fastest installed parser (see src/json_backend.py).
+
+    The decoded body is shared between callers of the same response; copy it before modifying it if the response is
+    used again. Requests that share a response in flight (see DirectPlusRequest) each get their own copy.
+    """
+    _json = _NOT_DECODED
+    _wire_bytes = None
+    # Trace of the request that produced this response, if tracing is enabled. Decoding is recorded as its last phase.
+    _trace = None
+    # Set when the request has been sent before the body was decoded: the trace then ends when this response is used.
+    _ends_trace = False
+
+    @classmethod
+    def wrap(cls, response: requests.Response) -> 'DirectPlusResponse':
+        """
+        Turns a requests.Response into a DirectPlusResponse in place and returns it.
+
+        :param response:
+        :return:
+        """
+        if not isinstance(response, cls):
+            response.__class__ = cls
+        return response
+
+    def copy(self) -> 'DirectPlusResponse':
+        """
+        Returns a response with the same status, headers and body bytes that decodes its own body, so changes to the
+        decoded body of one do not show in the other.
+
+        :return:
+        """
+        response = DirectPlusResponse()
+        response.__dict__.update(self.__dict__)
+        response.headers = self.headers.copy()
+        response.__dict__.pop('_json', None)
+        response.__dict__.pop('_trace', None)
+        response.__dict__.pop('_ends_trace', None)
+        return response
+
+    def _take_trace(self) -> bool:
+        """
+        Takes over ending the attached trace if the body has not been decoded yet. The trace then ends once the body is
+        decoded, so json_decode is its last phase, or once the response is closed without decoding it, e.g. after a
+        Projector read the fields it needs. A response that is neither ends its trace when it is garbage collected,
+        with the time it was taken over as the end. Returns False if there is no trace to take over.
+
+        :return:
+        """
+        if self._trace is None or self._json is not _NOT_DECODED:
+            return False
+        self._ends_trace = True
+        weakref.finalize(self, self._trace.end, time.perf_counter())
+        return True
+
+    def _end_trace(self) -> None:
+        if self._ends_trace:
+            trace, self._trace, self._ends_trace = self._trace, None, False
+            trace.end()
+
+    def close(self) -> None:
+        self._end_trace()
+        super().close()
+
+    @property
+    def wire_bytes(self) -> Union[int, None]:
+        """
+        Number of body bytes received over the network, before decompression. None if unknown, e.g. for responses
+        loaded from the cache.
+        """
+        if self._wire_bytes is not None:
+            return self._wire_bytes
+        tell = getattr(self.raw, 'tell', None)
+        return tell() if tell is not None else None
+
+    def json(self, **kwargs):
+        # Keyword arguments change the result, so only the default decoding is memoized.
+        if kwargs:
+            return super().json(**kwargs)
+        if self._json is _NOT_DECODED:
+            if self._trace is None:
+                self._json = json_backend.loads(self.content)
+            else:
+                start = time.perf_counter()
+                try:
+                    self._json = json_backend.loads(self.content)
+                finally:
+                    self._trace.add_phase('json_decode', start, time.perf_counter())
+                    self._end_trace()
+        return self._json
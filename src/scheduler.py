@@ -0,0 +1,239 @@
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple, Union
+
+from src.exceptions import DeadlineExceededException, SchedulerQueueFullException
+
+# Priority classes, most urgent first. A waiting request of a more urgent class is always admitted first.
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', NORMAL: 'normal', BULK: 'bulk'}
+
+
+class RequestContext:
+    """
+    Who a request is sent for: the job or tenant, its priority class and the deadline by which it must be sent.
+
+    :param job: Job or tenant name. Jobs of the same priority class share capacity by their weights.
+    :param priority: INTERACTIVE, NORMAL or BULK.
+    :param deadline: time.monotonic() by which the request must have been sent, or None.
+    """
+    __slots__ = ('job', 'priority', 'deadline')
+
+    def __init__(self, job: str = 'default', priority: int = NORMAL, deadline: float = None):
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"priority must be one of {sorted(PRIORITY_NAMES)}, not {priority}")
+        self.job = job
+        self.priority = priority
+        self.deadline = deadline
+
+    def remaining(self) -> Union[float, None]:
+        """
+        Seconds until the deadline, at least 0, or None without a deadline.
+        """
+        return max(self.deadline - time.monotonic(), 0.0) if self.deadline is not None else None
+
+
+_context: contextvars.ContextVar = contextvars.ContextVar('directplus_request_context', default=RequestContext())
+
+
+def current_context() -> RequestContext:
+    """
+    Returns the request_context of the current thread or task.
+    """
+    return _context.get()
+
+
+@contextmanager
+def request_context(job: str = 'default', priority: int = NORMAL, timeout: float = None) -> Iterator[RequestContext]:
+    """
+    Sends the requests made in the with block for job, with the given priority class. With a timeout, requests that
+    are still queued timeout seconds after the block was entered are dropped with a DeadlineExceededException
+    instead of being sent late. So are requests that wait that long for the response of an identical request in
+    flight.
+
+    Context is per thread (and per asyncio task), so set it in the function the worker threads run:
+
+        with request_context('lookup', INTERACTIVE, timeout=2):
+            dp.enrich_duns(duns, blockIDs)
+
+    :param job: Job or tenant name.
+    :param priority: INTERACTIVE, NORMAL or BULK.
+    :param timeout: Seconds from now by which the requests must have been sent.
+    :return:
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    token = _context.set(RequestContext(job, priority, deadline))
+    try:
+        yield _context.get()
+    finally:
+        _context.reset(token)
+
+
+class _Waiter:
+    __slots__ = ('context', 'granted', 'dropped', 'event')
+
+    def __init__(self, context: RequestContext):
+        self.context = context
+        self.granted = False
+        self.dropped = False
+        self.event = threading.Event()
+
+
+class RequestScheduler:
+    """
+    Admits at most max_concurrency requests of a session at a time and decides which waiting request goes next, so an
+    interactive lookup is not stuck behind a bulk job that shares the session.
+
+    * Priority classes: a waiting request of a more urgent class is always admitted before a less urgent one. reserved
+      slots are only used by INTERACTIVE requests, so one finds a free slot without waiting for bulk requests to
+      finish; bulk work uses all other capacity.
+    * Weighted fair queuing: within a class, jobs get slots in proportion to their weights (default 1), whatever the
+      number of threads each job runs.
+    * Bounded queues: at most queue_size requests per job wait. Further requests block until there is room, which slows
+      the job's producers down, or fail with a SchedulerQueueFullException if block is False.
+    * Deadlines: a request still waiting at the deadline of its request_context is dropped with a
+      DeadlineExceededException instead of being sent.
+
+    :param max_concurrency: Maximum number of requests in flight. Defaults to 8.
+    :param reserved: Slots only INTERACTIVE requests may use. Defaults to 1.
+    :param queue_size: Maximum number of waiting requests per job. Defaults to 1000.
+    :param weights: Weight per job name. Defaults to 1 for every job.
+    :param block: Block when a job's queue is full instead of raising. Defaults to True.
+    """
+    def __init__(self, max_concurrency: int = 8, reserved: int = 1, queue_size: int = 1000,
+                 weights: Dict[str, float] = None, block: bool = True):
+        if max_concurrency < 1 or not 0 <= reserved < max_concurrency:
+            raise ValueError(f"Need max_concurrency >= 1 and 0 <= reserved < max_concurrency, not {max_concurrency} "
+                             f"and {reserved}.")
+        self.log = logging.getLogger(__name__)
+        self.max_concurrency = max_concurrency
+        self.reserved = reserved
+        self.queue_size = queue_size
+        self.weights = weights or {}
+        self.block = block
+        self.metrics = None
+
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._queues: Dict[int, List[Tuple[float, int, _Waiter]]] = {priority: [] for priority in PRIORITY_NAMES}
+        self._queued: Dict[str, int] = {}
+        self._virtual_time: Dict[int, float] = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self._finish_tags: Dict[Tuple[int, str], float] = {}
+        self._counter = itertools.count()
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    @property
+    def queued(self) -> Dict[str, int]:
+        """
+        Number of waiting requests per job.
+        """
+        with self._lock:
+            return {job: count for job, count in self._queued.items() if count}
+
+    def _limit(self, priority: int) -> int:
+        return self.max_concurrency if priority == INTERACTIVE else self.max_concurrency - self.reserved
+
+    def _dispatch(self) -> None:
+        # Admits waiting requests while there are free slots. Must be called with the lock held.
+        now = time.monotonic()
+        for priority, queue in self._queues.items():
+            while queue and self._in_flight < self._limit(priority):
+                tag, _, waiter = heapq.heappop(queue)
+                if waiter.dropped:
+                    continue
+                self._dequeued(waiter)
+                if waiter.context.deadline is not None and now > waiter.context.deadline:
+                    waiter.dropped = True
+                else:
+                    self._virtual_time[priority] = tag
+                    waiter.granted = True
+                    self._in_flight += 1
+                waiter.event.set()
+            if queue:
+                # Less urgent classes wait until this one is served.
+                return
+
+    def _dequeued(self, waiter: _Waiter) -> None:
+        self._queued[waiter.context.job] -= 1
+        self._space.notify_all()
+
+    def _enqueue(self, context: RequestContext) -> _Waiter:
+        # Must be called with the lock held.
+        while self._queued.get(context.job, 0) >= self.queue_size:
+            if not self.block:
+                raise SchedulerQueueFullException(f"Queue of job '{context.job}' is full ({self.queue_size} requests).")
+            timeout = context.deadline - time.monotonic() if context.deadline is not None else None
+            if (timeout is not None and timeout <= 0) or not self._space.wait(timeout):
+                raise DeadlineExceededException(f"Deadline passed while job '{context.job}' had a full queue.")
+
+        waiter = _Waiter(context)
+        key = (context.priority, context.job)
+        start = max(self._virtual_time[context.priority], self._finish_tags.get(key, 0.0))
+        tag = self._finish_tags[key] = start + 1.0 / self.weights.get(context.job, 1.0)
+        heapq.heappush(self._queues[context.priority], (tag, next(self._counter), waiter))
+        self._queued[context.job] = self._queued.get(context.job, 0) + 1
+        return waiter
+
+    def _wait(self, waiter: _Waiter) -> None:
+        deadline = waiter.context.deadline
+        timeout = deadline - time.monotonic() if deadline is not None else None
+        if not waiter.event.wait(max(timeout, 0) if timeout is not None else None):
+            with self._lock:
+                if not waiter.granted and not waiter.dropped:
+                    waiter.dropped = True
+                    self._dequeued(waiter)
+        if not waiter.granted:
+            raise DeadlineExceededException(
+                f"Request of job '{waiter.context.job}' was still queued at its deadline and was dropped.")
+
+    def acquire(self) -> None:
+        """
+        Waits until the scheduler admits a request for the current request_context. Call release when the request is
+        done. Raises a DeadlineExceededException if the deadline passes first, or a SchedulerQueueFullException if the
+        job's queue is full and block is False.
+
+        :return:
+        """
+        context = _context.get()
+        priority = PRIORITY_NAMES[context.priority]
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                waiter = self._enqueue(context)
+                self._dispatch()
+            self._wait(waiter)
+        except (DeadlineExceededException, SchedulerQueueFullException) as e:
+            if self.metrics is not None:
+                self.metrics.inc('directplus_scheduler_dropped_total', job=context.job, priority=priority,
+                                 reason=type(e).__name__)
+            raise
+        if self.metrics is not None:
+            self.metrics.observe('directplus_scheduler_wait_seconds', time.perf_counter() - start, priority=priority)
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Holds a slot for the with block. See acquire.
+        """
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
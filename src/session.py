@@ -1,31 +1,251 @@
-import json
 import logging
+import socket
+import threading
 from time import time
+from typing import Dict, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.request import ACCEPT_ENCODING
 
+from src import json_backend
+from src.budget import Budget, CostModel
+from src.cassette import Cassette
 from src.decorators import timeit
+from src.http2_transport import Http2Adapter
+from src.metrics import Metrics
+from src.response import DirectPlusResponse
+from src.scheduler import RequestScheduler
+from src.single_flight import SingleFlight
+from src.tracing import Tracer
+
+
+Timeout = Union[float, Tuple[float, float]]
+
+DIRECT_PLUS_URL = 'https://plus.dnb.com'
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that enables TCP keep-alive on its sockets, so idle pooled connections, and the TLS sessions on them,
+    survive between requests instead of being dropped silently by firewalls and load balancers.
+
+    :param keepalive_idle: Seconds a connection is idle before the first keep-alive probe.
+    :param keepalive_interval: Seconds between probes.
+    :param keepalive_count: Number of unanswered probes before the connection is dropped.
+    :param kwargs: Passed to HTTPAdapter (pool_connections, pool_maxsize, pool_block, max_retries).
+    """
+    def __init__(self, keepalive_idle: int = 60, keepalive_interval: int = 10, keepalive_count: int = 6, **kwargs):
+        self.socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        # The tuning options are not available on every platform.
+        for option, value in (('TCP_KEEPIDLE', keepalive_idle), ('TCP_KEEPINTVL', keepalive_interval),
+                              ('TCP_KEEPCNT', keepalive_count)):
+            if hasattr(socket, option):
+                self.socket_options.append((socket.IPPROTO_TCP, getattr(socket, option), value))
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
 
 
 class DirectPlusSession(requests.Session):
     """
     Establish a session with the Direct+ API.
+
+    Connections are kept in a pool per host and reused, so parallel workers do not pay a TCP and TLS handshake for
+    every request. pool_maxsize should be at least the number of concurrent workers; connections beyond it are opened
+    and then discarded, unless pool_block is set, in which case workers wait for a free connection.
+
+    Responses are requested compressed with every encoding urllib3 can decode (gzip and deflate, br if brotli is
+    installed); the bytes received and decoded are counted in transfer_stats.
     """
-    def __init__(self, key_64: str, flags) -> None:
+    def __init__(self, key_64: str, flags, session_options: dict = None) -> None:
         """
         Initialize the session. Get an access token and set the session headers.
 
         :param key_64:
         :param flags:
+        :param session_options: Dictionary with the optional keys
+            pool_connections: Number of hosts to keep a pool for. Defaults to 10.
+            pool_maxsize: Maximum number of connections kept per host. Defaults to 10.
+            pool_block: Wait for a free connection instead of opening one beyond pool_maxsize. Defaults to False.
+            max_retries: Retries of failed connections. Defaults to 0.
+            keepalive: Enable TCP keep-alive on the sockets. Defaults to True.
+            keepalive_idle, keepalive_interval, keepalive_count: See KeepAliveAdapter.
+            timeout: Default (connect, read) timeout in seconds. Defaults to (5, 30).
+            endpoint_timeouts: Dictionary of endpoint name to timeout, e.g. {'dataBlocks': (5, 60)}.
+            http2: Send requests over HTTP/2 (see Http2Adapter). Falls back to HTTP/1.1 if httpx[http2] is not installed
+                or the server does not support it. Defaults to False.
+            http2_prior_knowledge: Also use HTTP/2 for plain http URLs, without negotiation. Defaults to False.
+            base_url: Send requests to this server instead of https://plus.dnb.com, e.g. a local stub server
+                (see benchmarks/stub_server.py). Defaults to None.
+            cache: Cache responses on disk and return cached responses (see RequestHash). Defaults to True, and is
+                always False with a cassette.
+            coalesce: Send identical requests that are in flight at the same time only once, and share the response.
+                Defaults to True.
+            cassette: Path to a cassette file to record all requests and responses to, or to replay them from. See
+                Cassette. The disk cache is turned off, so every request is recorded or replayed. Defaults to None.
+            cassette_mode: 'record' or 'replay'. Defaults to 'replay'.
+            replay_speed: Replay speed relative to the recording, e.g. 10 for ten times as fast. Defaults to 1.
+            replay_latency: Fixed delay of every replayed response in seconds. Overrides replay_speed.
+            cost_model: Dictionary with block_costs and endpoint_costs. See CostModel.
+            budget: Dictionary with daily, monthly and file_path. Calls that do not fit are refused with a
+                BudgetExceededException. See Budget. Defaults to None, no limits.
+            scheduler: Dictionary with max_concurrency, reserved, queue_size, weights and block. Requests are sent by
+                priority class and fairly between jobs (see RequestScheduler and request_context). Defaults to None,
+                requests are sent as soon as they are made.
         """
         super().__init__()
         self.log = logging.getLogger(__name__)
         self.key_64 = key_64
+        self._token_lock = threading.Lock()
         self.log.debug("Initializing Direct+ session.")
 
+        session_options = dict(session_options or {})
+        self.timeout: Timeout = session_options.pop('timeout', (5, 30))
+        self.endpoint_timeouts: Dict[str, Timeout] = session_options.pop('endpoint_timeouts', {})
+        self.base_url: Union[str, None] = session_options.pop('base_url', None)
+        self.cache_responses: bool = session_options.pop('cache', True)
+        # Requests in flight by request hash, see DirectPlusRequest.send.
+        self.in_flight = SingleFlight() if session_options.pop('coalesce', True) else None
+        self.cassette = None
+        cassette_path = session_options.pop('cassette', None)
+        cassette_options = {
+            'mode': session_options.pop('cassette_mode', 'replay'),
+            'speed': session_options.pop('replay_speed', 1.0),
+            'latency': session_options.pop('replay_latency', None),
+        }
+        if cassette_path is not None:
+            # Cached responses would be neither recorded nor replayed from the cassette.
+            if self.cache_responses:
+                self.log.info("Disabling the response cache, requests are recorded to or replayed from the cassette.")
+            self.cache_responses = False
+            self.cassette = Cassette(cassette_path, **cassette_options)
+        self.cost_model = CostModel(**session_options.pop('cost_model', {}))
+        budget_options = session_options.pop('budget', None)
+        self.budget = Budget(**budget_options) if budget_options is not None else None
+        scheduler_options = session_options.pop('scheduler', None)
+        self.scheduler = RequestScheduler(**scheduler_options) if scheduler_options is not None else None
+        self._adapter_options = {
+            'pool_connections': 10,
+            'pool_maxsize': 10,
+            'pool_block': False,
+            'max_retries': 0,
+            'keepalive': True,
+            'http2': False,
+            'http2_prior_knowledge': False,
+            **session_options,
+        }
+        self._mount_adapter()
+        self.headers['Accept-Encoding'] = ', '.join(ACCEPT_ENCODING.split(','))
+        self.transfer_stats = {'responses': 0, 'wire_bytes': 0, 'body_bytes': 0}
+        self.metrics = Metrics()
+        self.tracer = Tracer()
+        if self.scheduler is not None:
+            self.scheduler.metrics = self.metrics
+        self._stats_lock = threading.Lock()
+
         self.access_token, self.access_token_expires = self._get_access_token(key_64)
         self.log.debug(f"Access token expires in {self.access_token_expires - time()} seconds.")
 
+    def _mount_adapter(self) -> None:
+        replaced = list(self.adapters.values())
+        options = dict(self._adapter_options)
+        http2 = options.pop('http2')
+        prior_knowledge = options.pop('http2_prior_knowledge')
+        if options.pop('keepalive'):
+            adapter = KeepAliveAdapter(**options)
+        else:
+            options = {k: v for k, v in options.items() if not k.startswith('keepalive_')}
+            adapter = HTTPAdapter(**options)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+        if http2:
+            if Http2Adapter.available():
+                http2_adapter = Http2Adapter(max_connections=options['pool_maxsize'], prior_knowledge=prior_knowledge,
+                                             fallback=adapter)
+                self.mount('https://', http2_adapter)
+                if prior_knowledge:
+                    self.mount('http://', http2_adapter)
+            else:
+                self.log.warning("HTTP/2 requested but httpx[http2] is not installed. Using HTTP/1.1.")
+        if self.cassette is not None:
+            for prefix in ('https://', 'http://'):
+                self.mount(prefix, self.cassette.adapter(self.adapters[prefix]))
+            self.log.info(f"Cassette {self.cassette.path} in {self.cassette.mode} mode.")
+        self.log.debug(f"Mounted connection pool adapter: {self._adapter_options}")
+
+        # Closes the pooled sockets of the adapters that were replaced, instead of leaving them to garbage collection.
+        # A cassette wrapper closes the adapter it wraps.
+        mounted = {id(adapter) for adapter in self.adapters.values()}
+        closed = set()
+        for adapter in replaced:
+            if id(adapter) not in mounted and id(adapter) not in closed:
+                closed.add(id(adapter))
+                adapter.close()
+
+    def ensure_pool_size(self, workers: int) -> None:
+        """
+        Grows the connection pool to at least workers connections per host, so concurrent workers do not open and
+        discard connections beyond the pool. The replaced adapters are closed, which closes their idle pooled
+        connections; connections in use are discarded when they are returned.
+
+        :param workers: Number of threads that send requests concurrently.
+        :return:
+        """
+        if workers <= self._adapter_options['pool_maxsize']:
+            return
+        self.log.info(f"Growing connection pool from {self._adapter_options['pool_maxsize']} to {workers}.")
+        self._adapter_options['pool_maxsize'] = workers
+        self._mount_adapter()
+
+    def _record_transfer(self, response: DirectPlusResponse) -> DirectPlusResponse:
+        wire_bytes = response.wire_bytes
+        body_bytes = len(response.content)
+        if wire_bytes is None:
+            wire_bytes = body_bytes
+        with self._stats_lock:
+            self.transfer_stats['responses'] += 1
+            self.transfer_stats['wire_bytes'] += wire_bytes
+            self.transfer_stats['body_bytes'] += body_bytes
+        self.log.trace("Received %d bytes for a %d byte body, Content-Encoding: %s.", wire_bytes, body_bytes,
+                       response.headers.get('Content-Encoding', 'identity'))
+        return response
+
+    @property
+    def compression_ratio(self) -> float:
+        """
+        Decoded body bytes per byte received over the network, over all responses of this session.
+        """
+        with self._stats_lock:
+            return self.transfer_stats['body_bytes'] / max(self.transfer_stats['wire_bytes'], 1)
+
+    def resolve_url(self, url: str) -> str:
+        """
+        Returns the url on base_url if one is set, otherwise the url unchanged.
+
+        :param url:
+        :return:
+        """
+        if self.base_url is not None and url.startswith(DIRECT_PLUS_URL):
+            return self.base_url.rstrip('/') + url[len(DIRECT_PLUS_URL):]
+        return url
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        return super().request(method, self.resolve_url(url), *args, **kwargs)
+
+    def timeout_for(self, endpoint_name: str) -> Timeout:
+        """
+        Returns the timeout for an endpoint, or the default timeout.
+
+        :param endpoint_name:
+        :return:
+        """
+        return self.endpoint_timeouts.get(endpoint_name, self.timeout)
+
     @property
     def access_token(self) -> str:
         """
@@ -52,8 +272,11 @@ class DirectPlusSession(requests.Session):
         :return:
         """
         if time() > self.access_token_expires:
-            self.access_token, self.access_token_expires = self._get_access_token(self.key_64)
-            self.log.debug(f"Access token expires in {self.access_token_expires - time()} seconds.")
+            with self._token_lock:
+                # Another thread may have refreshed the token while this one waited for the lock.
+                if time() > self.access_token_expires:
+                    self.access_token, self.access_token_expires = self._get_access_token(self.key_64)
+                    self.log.debug(f"Access token expires in {self.access_token_expires - time()} seconds.")
 
     def _get_access_token(self, key_64: str) -> (str, int):
         """
@@ -62,7 +285,7 @@ class DirectPlusSession(requests.Session):
         :param key_64:
         :return:
         """
-        auth_address = 'https://plus.dnb.com/v2/token'
+        auth_address = f'{DIRECT_PLUS_URL}/v2/token'
 
         self.headers.update({
             'Content-Type': 'application/json',
@@ -73,12 +296,13 @@ class DirectPlusSession(requests.Session):
         self.log.debug(f"Address: {auth_address}")
         response = super().post(auth_address, json={
             "grant_type": "client_credentials"
-        })
+        }, timeout=self.timeout)
 
         self.log.debug(f"Response: {response}")
-        token = json.loads(response.text)['access_token']
+        body = json_backend.loads(response.content)
+        token = body['access_token']
         self.log.debug(f"Access token aquired")
-        expires = time() + json.loads(response.text)['expiresIn']
+        expires = time() + body['expiresIn']
 
         self.log.debug("Setting session headers.")
         self.headers.update({
@@ -88,23 +312,22 @@ class DirectPlusSession(requests.Session):
 
         return token, expires
 
-    @timeit
-    def get(self, url: str, **kwargs) -> requests.Response:
+    def get(self, url: str, **kwargs) -> DirectPlusResponse:
         """
-        Get a response from the API. If the access token has expired, get a new one.
+        Get a response from the API. If the access token has expired, get a new one. Uses the default timeout unless
+        one is given.
 
         :param url:
         :param kwargs:
         :return:
         """
         self.refresh_access_token_if_necessary()
+        return self.fetch('GET', url, **kwargs)
 
-        return super().get(url, **kwargs)
-
-    @timeit
-    def post(self, url: str, data='', **kwargs) -> requests.Response:
+    def post(self, url: str, data='', **kwargs) -> DirectPlusResponse:
         """
-        Post data to the API. If the access token has expired, get a new one.
+        Post data to the API. If the access token has expired, get a new one. Uses the default timeout unless one is
+        given.
 
         :param url:
         :param data:
@@ -112,5 +335,19 @@ class DirectPlusSession(requests.Session):
         :return: A response object
         """
         self.refresh_access_token_if_necessary()
+        return self.fetch('POST', url, **kwargs)
+
+    @timeit
+    def fetch(self, method: str, url: str, **kwargs) -> DirectPlusResponse:
+        """
+        Sends a request without checking the access token first, for callers that have just refreshed it themselves
+        (see DirectPlusRequest, which times the refresh as a phase of its trace). Uses the default timeout unless one
+        is given.
 
-        return super().post(url, timeout=10, **kwargs)
+        :param method: 'GET' or 'POST'.
+        :param url:
+        :param kwargs:
+        :return:
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        return self._record_transfer(DirectPlusResponse.wrap(self.request(method, url, **kwargs)))
@@ -0,0 +1,71 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple, Union
+
+
+class SingleFlightTimeout(TimeoutError):
+    """
+    Raised in a caller that waited longer than its timeout for a call in flight.
+    """
+    pass
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. A thread that asks for a key that is already in flight waits for that
+    call and gets its result, or its exception, instead of making the call again. Once the call has finished, the
+    next request for the key makes a new call.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: Hashable, function: Callable[[], Any], timeout: Union[float, None] = None,
+           join: Callable[[], None] = None) -> Tuple[Any, bool]:
+        """
+        Returns the result of function(), or of the call in flight for key, and whether it was shared with that call.
+
+        :param key:
+        :param function:
+        :param timeout: Seconds to wait for a call in flight before raising a SingleFlightTimeout. The call itself goes
+            on.
+        :param join: Called before waiting for a call in flight, e.g. to give back resources only a call needs.
+        :return:
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if join is not None:
+                join()
+            if not call.done.wait(timeout):
+                raise SingleFlightTimeout(f"The call in flight for {key!r} did not finish within {timeout} seconds.")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
@@ -0,0 +1,208 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, List, Union
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+# Phases recorded for every DirectPlusRequest, in order.
+PHASES = ('validate', 'cache_check', 'queue', 'token_refresh', 'http', 'error_handler', 'json_decode')
+
+
+class Phase:
+    """
+    A timed phase of a request. offset and duration are in seconds; offset is relative to the start of the trace.
+    """
+    __slots__ = ('name', 'offset', 'duration')
+
+    def __init__(self, name: str, offset: float, duration: float):
+        self.name = name
+        self.offset = offset
+        self.duration = duration
+
+    def __repr__(self) -> str:
+        return f"Phase({self.name!r}, offset={self.offset:.6f}, duration={self.duration:.6f})"
+
+
+class Trace:
+    """
+    Timings of one request, split into phases. Tagged with the endpoint, the duns number if the request has one, and a
+    correlation id that is sent to Direct+ as customerReference, so a slow request can be found on both sides.
+
+    :param tracer: Tracer whose hooks are called.
+    :param endpoint: Endpoint name.
+    :param attributes: Additional tags, e.g. duns.
+    """
+    def __init__(self, tracer: 'Tracer', endpoint: str, **attributes):
+        self.tracer = tracer
+        self.correlation_id = uuid.uuid4().hex
+        self.attributes = {'endpoint': endpoint, 'correlation_id': self.correlation_id, **attributes}
+        self.phases: List[Phase] = []
+        self.start_time_ns = time.time_ns()
+        self.duration = None
+        self._start = time.perf_counter()
+        self.tracer.emit('on_start', self)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times the with block as a phase of this trace.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, start, time.perf_counter())
+
+    def add_phase(self, name: str, start: float, end: float) -> None:
+        """
+        Adds a phase from perf_counter timestamps.
+        """
+        phase = Phase(name, start - self._start, end - start)
+        self.phases.append(phase)
+        self.tracer.emit('on_phase', self, phase)
+
+    def end(self, end: float = None) -> None:
+        """
+        Ends the trace, at the perf_counter timestamp end if given. Only the first call has an effect.
+        """
+        if self.duration is not None:
+            return
+        self.duration = (end if end is not None else time.perf_counter()) - self._start
+        self.tracer.emit('on_end', self)
+
+    def as_dict(self) -> dict:
+        return {
+            **self.attributes,
+            'duration': self.duration,
+            'phases': {phase.name: phase.duration for phase in self.phases},
+        }
+
+
+class NullTrace:
+    """
+    Stand-in used when no hooks are registered. Records nothing.
+    """
+    correlation_id = None
+
+    def phase(self, name: str):
+        return nullcontext()
+
+    def add_phase(self, name: str, start: float, end: float) -> None:
+        pass
+
+    def end(self, end: float = None) -> None:
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class TraceHook:
+    """
+    Base class for tracing hooks. Override any of the callbacks. They are called on the thread of the request, so they
+    must be fast and must not raise.
+    """
+    def on_start(self, trace: Trace) -> None:
+        pass
+
+    def on_phase(self, trace: Trace, phase: Phase) -> None:
+        pass
+
+    def on_end(self, trace: Trace) -> None:
+        pass
+
+
+class Tracer:
+    """
+    Creates a Trace for every request while at least one hook is registered. Without hooks tracing costs nothing and
+    requests are sent unchanged.
+    """
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+        self.hooks: List[TraceHook] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.hooks)
+
+    def add_hook(self, hook: TraceHook) -> None:
+        self.hooks.append(hook)
+
+    def start(self, endpoint: str, **attributes) -> Union[Trace, NullTrace]:
+        if not self.hooks:
+            return NULL_TRACE
+        return Trace(self, endpoint, **{k: v for k, v in attributes.items() if v is not None})
+
+    def emit(self, callback: str, *args) -> None:
+        for hook in self.hooks:
+            try:
+                getattr(hook, callback)(*args)
+            except Exception as e:
+                self.log.warning(f"Tracing hook {type(hook).__name__}.{callback} failed: {e}")
+
+
+class LoggingTraceHook(TraceHook):
+    """
+    Logs one line per request with the duration of every phase.
+
+    :param level: Log level. Defaults to DEBUG.
+    """
+    def __init__(self, level: int = logging.DEBUG):
+        self.log = logging.getLogger(__name__)
+        self.level = level
+
+    def on_end(self, trace: Trace) -> None:
+        if self.log.isEnabledFor(self.level):
+            phases = ' '.join(f"{phase.name}={phase.duration * 1000:.1f}ms" for phase in trace.phases)
+            self.log.log(self.level, f"{trace.attributes} total={trace.duration * 1000:.1f}ms {phases}")
+
+
+class MetricsTraceHook(TraceHook):
+    """
+    Records every phase in the histogram directplus_phase_seconds{endpoint, phase}.
+
+    :param metrics: Metrics instance, e.g. DirectPlus.metrics.
+    """
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def on_phase(self, trace: Trace, phase: Phase) -> None:
+        self.metrics.observe('directplus_phase_seconds', phase.duration, endpoint=trace.attributes['endpoint'],
+                             phase=phase.name)
+
+
+class OpenTelemetryTraceHook(TraceHook):
+    """
+    Exports each request as an OpenTelemetry span with one child span per phase. Requires the optional package
+    opentelemetry-api and a configured tracer provider.
+
+    :param tracer_name: Name of the OpenTelemetry tracer. Defaults to 'directplus'.
+    """
+    def __init__(self, tracer_name: str = 'directplus'):
+        if otel_trace is None:
+            raise ImportError("OpenTelemetryTraceHook requires opentelemetry-api: pip install opentelemetry-api")
+        self.tracer = otel_trace.get_tracer(tracer_name)
+
+    @staticmethod
+    def _ns(trace: Trace, offset: float) -> int:
+        return trace.start_time_ns + int(offset * 1e9)
+
+    def on_start(self, trace: Trace) -> None:
+        trace.otel_span = self.tracer.start_span(
+            f"DirectPlus {trace.attributes['endpoint']}",
+            start_time=trace.start_time_ns,
+            attributes={f"directplus.{key}": str(value) for key, value in trace.attributes.items()},
+        )
+
+    def on_phase(self, trace: Trace, phase: Phase) -> None:
+        context = otel_trace.set_span_in_context(trace.otel_span)
+        span = self.tracer.start_span(phase.name, context=context, start_time=self._ns(trace, phase.offset))
+        span.end(end_time=self._ns(trace, phase.offset + phase.duration))
+
+    def on_end(self, trace: Trace) -> None:
+        trace.otel_span.end(end_time=self._ns(trace, trace.duration))
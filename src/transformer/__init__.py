@@ -9,6 +9,8 @@ from src.transformer.aligner import ArrayAligner
 from src.transformer.csv_exporter import CSVExporter
 from src.transformer.xlsx_exporter import XLSXExporter
 from src.transformer.flattener import Flattener
+from src.transformer.parallel import ParallelFlattener
+from src.transformer.projector import Projector
 
 
 class Transformer:
@@ -25,19 +27,31 @@ class Transformer:
         self.data = data
 
     @timeit
-    def process_data(self, flattener_options: dict = None) -> List[dict]:
+    def process_data(self, flattener_options: dict = None, parallel_options: dict = None) -> List[dict]:
         """
         Flattens and aligns arrays in a list of dictionaries. If flattener_options is provided, the flattener will be
         initialized with the provided options. Otherwise, the flattener will be initialized with the default options.
+        If parallel_options is provided, the data is flattened in chunks in a process pool. The order of the data is
+        preserved.
 
         :param flattener_options:  Options to initialize the flattener with.
+        :param parallel_options:  Options to initialize the ParallelFlattener with (chunk_size, workers).
         :return:  List of dictionaries with flattened and aligned arrays.
         """
+        array_aligner = ArrayAligner()
+
+        if parallel_options is not None:
+            try:
+                parallel_flattener = ParallelFlattener(flattener_options, **parallel_options)
+            except FlattenerError as e:
+                raise RuntimeError(f"Error initializing ParallelFlattener: {e}")
+            flattened_data, keys = parallel_flattener.flatten(self.data)
+            return array_aligner.align_arrays(flattened_data, keys)
+
         try:
             flattener = Flattener(**flattener_options) if flattener_options else Flattener()
         except FlattenerError as e:
             raise RuntimeError(f"Error initializing Flattener: {e}")
-        array_aligner = ArrayAligner()
 
         flattened_data = [flattener.flatten(d) for d in self.data]
         aligned_data = array_aligner.align_arrays(flattened_data)
@@ -47,7 +61,7 @@ class Transformer:
     @timeit
     def export_to_csv(self, file_path: str, include_headers: bool = True, delimiter: str = ',',
                       flattener_options: dict = None, overwrite: bool = False, keys_to_write: List[str] = None,
-                      do_not_flatten: bool = False
+                      do_not_flatten: bool = False, parallel_options: dict = None
                       ) -> None:
         """
         Exports a list of dictionaries to a CSV file. If include_headers is True, the first row of the CSV file will
@@ -61,6 +75,7 @@ class Transformer:
         :param include_headers:  If True, the first row of the CSV file will contain the keys of the dictionaries.
         :param delimiter:  Delimiter to use between values in the CSV file.
         :param flattener_options:  Options to initialize the flattener with.
+        :param parallel_options:  If provided, flatten in a process pool. See process_data.
         :return:  None
         """
         if not file_path:
@@ -71,7 +86,7 @@ class Transformer:
             file_path = Path(parent) / file_path
 
         try:
-            flattened_data = self.process_data(flattener_options) if not do_not_flatten else self.data
+            flattened_data = self.process_data(flattener_options, parallel_options) if not do_not_flatten else self.data
             CSVExporter.run(flattened_data, file_path, include_headers, delimiter, overwrite=overwrite, keys_to_write=keys_to_write)
         except CSVExportError as e:
             raise RuntimeError(f"Error exporting to CSV") from e
@@ -80,7 +95,7 @@ class Transformer:
 
     def export_to_excel(self, file_path: str, include_headers: bool = True, delimiter: str = ',',
                         flattener_options: dict = None, overwrite: bool = False, keys_to_write: List[str] = None,
-                        do_not_flatten: bool = False
+                        do_not_flatten: bool = False, parallel_options: dict = None
                         ) -> None:
         """
         Exports a list of dictionaries to an Excel file. If include_headers is True, the first row of the Excel file
@@ -94,6 +109,7 @@ class Transformer:
         :param include_headers:  If True, the first row of the Excel file will contain the keys of the dictionaries.
         :param delimiter:  Delimiter to use between values in the Excel file.
         :param flattener_options:  Options to initialize the flattener with.
+        :param parallel_options:  If provided, flatten in a process pool. See process_data.
         :return:  None
         """
         if not file_path:
@@ -104,7 +120,7 @@ class Transformer:
             file_path = Path(parent) / file_path
 
         try:
-            flattened_data = self.process_data(flattener_options) if not do_not_flatten else self.data
+            flattened_data = self.process_data(flattener_options, parallel_options) if not do_not_flatten else self.data
             XLSXExporter.run(flattened_data, file_path, include_headers, overwrite=overwrite, keys_to_write=keys_to_write)
         except XLSXExportError as e:
             raise RuntimeError(f"Error exporting to CSV") from e
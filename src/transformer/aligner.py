@@ -8,11 +8,12 @@ class ArrayAligner:
     """
 
     @staticmethod
-    def align_arrays(data: List[dict]) -> List[dict]:
+    def align_arrays(data: List[dict], keys: set = None) -> List[dict]:
         """
         Aligns arrays in a list of dictionaries.
 
         :param data: List of dictionaries.
+        :param keys: Union of keys of all dictionaries, if already known. Computed from data if None.
         :return: List of dictionaries with aligned arrays.
         """
         if not data:
@@ -26,7 +27,8 @@ class ArrayAligner:
             raise TypeError(f"Data must be a list of dictionaries.")
 
         # Get the union of keys from all dictionaries
-        keys = set().union(*(d.keys() for d in data))
+        if keys is None:
+            keys = set().union(*(d.keys() for d in data))
 
         # Add missing keys to each dictionary
         for d in data:
@@ -0,0 +1,73 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from src.exceptions import FlattenerError
+from src.transformer.flattener import Flattener
+
+
+def _flatten_chunk(flattener_options: dict, chunk: List[dict]) -> Tuple[List[dict], set]:
+    """
+    Flattens a chunk of dictionaries in a worker process. The Flattener is rebuilt from its options in the worker, so
+    only the (picklable) options and the chunk itself cross the process boundary.
+
+    :param flattener_options: Options to initialize the flattener with.
+    :param chunk: List of dictionaries to flatten.
+    :return: The flattened chunk and the set of keys found in it.
+    """
+    flattener = Flattener(**flattener_options)
+    flattened_chunk = [flattener.flatten(d) for d in chunk]
+    keys = set().union(*(d.keys() for d in flattened_chunk))
+    return flattened_chunk, keys
+
+
+class ParallelFlattener:
+    """
+    Flattens a list of dictionaries in a process pool. The input is split into chunks of chunk_size dictionaries, each
+    chunk is flattened in a worker process and the results are merged back in input order.
+
+    :param flattener_options: Options to initialize the flattener with. Must be picklable.
+    :param chunk_size: Number of dictionaries per chunk. Defaults to 1000.
+    :param workers: Number of worker processes. Defaults to the number of CPUs.
+    """
+    def __init__(self, flattener_options: dict = None, chunk_size: int = 1000, workers: int = None):
+        self.log = logging.getLogger(__name__)
+
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise FlattenerError(f"chunk_size must be a positive integer, not {chunk_size}")
+        if workers is not None and (not isinstance(workers, int) or workers < 1):
+            raise FlattenerError(f"workers must be a positive integer, not {workers}")
+
+        self.flattener_options = flattener_options or {}
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+
+        # Fail fast in the parent process instead of once per worker.
+        Flattener(**self.flattener_options)
+
+    def _chunks(self, data: List[dict]) -> List[List[dict]]:
+        return [data[i:i + self.chunk_size] for i in range(0, len(data), self.chunk_size)]
+
+    def flatten(self, data: List[dict]) -> Tuple[List[dict], set]:
+        """
+        Flattens a list of dictionaries. Small inputs that fit in a single chunk are flattened in the current process.
+
+        :param data: List of dictionaries to flatten.
+        :return: The flattened dictionaries in input order and the union of their keys.
+        """
+        chunks = self._chunks(data)
+        if len(chunks) <= 1 or self.workers == 1:
+            return _flatten_chunk(self.flattener_options, data)
+
+        self.log.debug(f"Flattening {len(data)} records in {len(chunks)} chunks with {self.workers} workers.")
+        flattened_data = []
+        keys = set()
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks))) as executor:
+            # Executor.map yields results in submission order, which preserves the input order.
+            for flattened_chunk, chunk_keys in executor.map(
+                    _flatten_chunk, [self.flattener_options] * len(chunks), chunks):
+                flattened_data.extend(flattened_chunk)
+                keys.update(chunk_keys)
+
+        return flattened_data, keys
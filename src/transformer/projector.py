@@ -0,0 +1,183 @@
+import json
+import logging
+import re
+from json.decoder import scanstring
+from typing import List, Union
+
+from src.exceptions import ProjectorError
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _Done(Exception):
+    """
+    Raised internally when every requested path has been found, so the rest of the document is never scanned.
+    """
+    pass
+
+
+class _Node:
+    __slots__ = ('children', 'path')
+
+    def __init__(self):
+        self.children = {}
+        self.path = None
+
+
+class Projector:
+    """
+    Extracts selected fields from a raw JSON document without decoding the whole document. Fields are given as paths
+    using the same delimiter convention as the Flattener, so 'organization.countryISOAlpha2Code' selects the same value
+    as the flattened key with that name. List items are selected by index, e.g. 'organization.industryCodes.0.code'.
+
+    The document is scanned once along the requested paths. Sibling values outside those paths are skipped one at a
+    time, so the full object tree is never built, and scanning stops as soon as all paths have been found.
+
+    :param fields: List of paths to extract.
+    :param delimiter: Delimiter used between keys in the paths. Defaults to '.'.
+    """
+    def __init__(self, fields: List[str], delimiter: str = '.'):
+        self.log = logging.getLogger(__name__)
+
+        if not isinstance(fields, (list, tuple)) or not all(isinstance(f, str) and f for f in fields):
+            raise ProjectorError("fields must be a list of non-empty strings.")
+        if not isinstance(delimiter, str) or not delimiter:
+            raise ProjectorError("delimiter must be a non-empty string.")
+
+        # Duplicates would keep the count of remaining paths above zero and the scan from stopping early.
+        self.fields = list(dict.fromkeys(fields))
+        self.delimiter = delimiter
+        self._root = _Node()
+        self._scan_once = json.JSONDecoder().scan_once
+
+        for field in self.fields:
+            node = self._root
+            for segment in field.split(delimiter):
+                node = node.children.setdefault(segment, _Node())
+            node.path = field
+
+    def project(self, document: Union[str, bytes, dict]) -> dict:
+        """
+        Returns a flat dictionary with the requested paths as keys. Paths that are not present in the document have a
+        value of None.
+
+        :param document: Raw JSON document (str or bytes), or an already decoded dictionary.
+        :return: Dictionary of path -> value.
+        """
+        result = dict.fromkeys(self.fields)
+
+        if isinstance(document, dict):
+            self._fill_from_value(self._root, document, result)
+            return result
+
+        if isinstance(document, (bytes, bytearray)):
+            document = document.decode('utf-8')
+        if not isinstance(document, str):
+            raise ProjectorError(f"Document must be a str, bytes or dict, not {type(document)}")
+
+        state = {'remaining': len(self.fields)}
+        try:
+            idx = _WHITESPACE.match(document, 0).end()
+            self._visit(document, idx, self._root, result, state)
+        except _Done:
+            pass
+        except (ValueError, IndexError, StopIteration) as e:
+            raise ProjectorError(f"Could not parse document: {e}") from e
+
+        return result
+
+    def _found(self, result: dict, state: dict, path: str, value) -> None:
+        result[path] = value
+        state['remaining'] -= 1
+        if state['remaining'] == 0:
+            raise _Done()
+
+    def _visit(self, s: str, idx: int, node: _Node, result: dict, state: dict) -> int:
+        """
+        Visits the value starting at idx. Returns the index just after the value.
+        """
+        if node.path is not None:
+            value, end = self._scan_once(s, idx)
+            self._fill_from_value(node, value, result, state)
+            return end
+
+        char = s[idx]
+        if char == '{':
+            return self._visit_object(s, idx, node, result, state)
+        elif char == '[':
+            return self._visit_array(s, idx, node, result, state)
+        return self._skip(s, idx)
+
+    def _visit_object(self, s: str, idx: int, node: _Node, result: dict, state: dict) -> int:
+        idx = _WHITESPACE.match(s, idx + 1).end()
+        if s[idx] == '}':
+            return idx + 1
+
+        while True:
+            if s[idx] != '"':
+                raise ValueError(f"Expecting property name at {idx}")
+            key, idx = scanstring(s, idx + 1)
+            idx = _WHITESPACE.match(s, idx).end()
+            if s[idx] != ':':
+                raise ValueError(f"Expecting ':' at {idx}")
+            idx = _WHITESPACE.match(s, idx + 1).end()
+
+            child = node.children.get(key)
+            if child is None:
+                idx = self._skip(s, idx)
+            else:
+                idx = self._visit(s, idx, child, result, state)
+
+            idx = _WHITESPACE.match(s, idx).end()
+            if s[idx] == '}':
+                return idx + 1
+            if s[idx] != ',':
+                raise ValueError(f"Expecting ',' at {idx}")
+            idx = _WHITESPACE.match(s, idx + 1).end()
+
+    def _visit_array(self, s: str, idx: int, node: _Node, result: dict, state: dict) -> int:
+        idx = _WHITESPACE.match(s, idx + 1).end()
+        if s[idx] == ']':
+            return idx + 1
+
+        index = 0
+        while True:
+            child = node.children.get(str(index))
+            if child is None:
+                idx = self._skip(s, idx)
+            else:
+                idx = self._visit(s, idx, child, result, state)
+
+            idx = _WHITESPACE.match(s, idx).end()
+            if s[idx] == ']':
+                return idx + 1
+            if s[idx] != ',':
+                raise ValueError(f"Expecting ',' at {idx}")
+            idx = _WHITESPACE.match(s, idx + 1).end()
+            index += 1
+
+    def _skip(self, s: str, idx: int) -> int:
+        """
+        Skips the value starting at idx. Returns the index just after the value.
+
+        The value is run through the C scanner and discarded straight away. Walking the brackets in Python instead
+        would avoid the allocation but is several times slower than decoding, so the subtree only lives as long as
+        this call and never becomes part of a full document tree.
+        """
+        return self._scan_once(s, idx)[1]
+
+    def _fill_from_value(self, node: _Node, value, result: dict, state: dict = None) -> None:
+        """
+        Fills the result for node and all its descendants from an already decoded value.
+        """
+        if node.path is not None:
+            if state is None:
+                result[node.path] = value
+            else:
+                self._found(result, state, node.path, value)
+
+        for segment, child in node.children.items():
+            if isinstance(value, dict) and segment in value:
+                self._fill_from_value(child, value[segment], result, state)
+            elif isinstance(value, list) and segment.isdigit() and int(segment) < len(value):
+                self._fill_from_value(child, value[int(segment)], result, state)
@@ -1,8 +1,6 @@
 from pathlib import Path
 from typing import List
 
-from openpyxl.workbook import Workbook
-
 
 class XLSXExporter:
     """
@@ -71,6 +69,8 @@ class XLSXExporter:
         XLSXExporter._check_and_create_directory(file_path, create_parent)
         XLSXExporter._check_and_create_file(file_path, overwrite, override_suffix)
 
+        # openpyxl is slow to import and only needed here.
+        from openpyxl.workbook import Workbook
         workbook = Workbook()
         worksheet = workbook.active
 
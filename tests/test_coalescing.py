@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from src.direct_plus import DirectPlus
+
+BLOCK_IDS = 'companyinfo_L2_v1'
+
+
+@pytest.fixture
+def stub():
+    # Long enough for two requests started together to be in flight at the same time.
+    with StubServer(latency=0.3) as stub:
+        yield stub
+
+
+@pytest.fixture
+def dp(stub):
+    return DirectPlus(StubServer.CREDENTIALS, *StubServer.FLAGS,
+                      session_options={'base_url': stub.url, 'cache': False})
+
+
+def enrich_together(dp: DirectPlus, count: int) -> list:
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def enrich(index: int) -> None:
+        barrier.wait()
+        results[index] = dp.enrich_duns('000000001', BLOCK_IDS)
+
+    threads = [threading.Thread(target=enrich, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_requests_are_sent_once(dp, stub):
+    results = enrich_together(dp, 4)
+
+    assert stub.requests['dataBlocks'] == 1
+    assert dp.metrics.counter('directplus_coalesced_total') == 3
+    assert all(result == results[0] for result in results)
+
+
+def test_coalesced_results_are_independent(dp):
+    first, second = enrich_together(dp, 2)
+    assert dp.metrics.counter('directplus_coalesced_total') == 1
+    assert first is not second
+
+    expected = dict(second['organization'])
+    first['organization']['primaryName'] = 'changed'
+    first['organization'].clear()
+
+    assert second['organization'] == expected
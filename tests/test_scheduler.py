@@ -0,0 +1,200 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from src.direct_plus import DirectPlus
+from src.exceptions import DeadlineExceededException, SchedulerQueueFullException
+from src.metrics import Metrics
+from src.scheduler import BULK, INTERACTIVE, NORMAL, RequestScheduler, request_context
+
+BLOCK_IDS = 'companyinfo_L2_v1'
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Condition not met in time."
+        time.sleep(0.005)
+
+
+def start(function, *args) -> threading.Thread:
+    thread = threading.Thread(target=function, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+class Holder:
+    """
+    Holds a slot of a scheduler until released.
+    """
+    def __init__(self, scheduler: RequestScheduler, job: str = 'holder', priority: int = NORMAL):
+        self.scheduler = scheduler
+        self.release = threading.Event()
+        self.thread = start(self._hold, job, priority)
+        wait_until(lambda: scheduler.in_flight >= 1)
+
+    def _hold(self, job: str, priority: int) -> None:
+        with request_context(job, priority), self.scheduler.slot():
+            self.release.wait()
+
+    def stop(self) -> None:
+        self.release.set()
+        self.thread.join()
+
+
+def admit_in_order(scheduler: RequestScheduler, requests: list) -> list:
+    """
+    Queues (job, priority) requests behind a held slot, frees it, and returns the jobs in the order they were
+    admitted.
+    """
+    admitted = []
+    holder = Holder(scheduler)
+
+    def request(job: str, priority: int) -> None:
+        with request_context(job, priority), scheduler.slot():
+            admitted.append(job)
+
+    threads = []
+    for number, (job, priority) in enumerate(requests, start=1):
+        threads.append(start(request, job, priority))
+        wait_until(lambda: sum(scheduler.queued.values()) == number)
+    holder.stop()
+    for thread in threads:
+        thread.join()
+    return admitted
+
+
+def test_more_urgent_classes_go_first():
+    scheduler = RequestScheduler(max_concurrency=1, reserved=0)
+    admitted = admit_in_order(scheduler, [('bulk', BULK), ('normal', NORMAL), ('lookup', INTERACTIVE)])
+    assert admitted == ['lookup', 'normal', 'bulk']
+
+
+def test_jobs_share_a_class_by_weight():
+    scheduler = RequestScheduler(max_concurrency=1, reserved=0, weights={'a': 2})
+    admitted = admit_in_order(scheduler, [('a', BULK)] * 6 + [('b', BULK)] * 6)
+    assert admitted[:6].count('a') == 4
+    assert admitted[:6].count('b') == 2
+
+
+def test_reserved_slots_are_kept_for_interactive_requests():
+    scheduler = RequestScheduler(max_concurrency=2, reserved=1)
+    holder = Holder(scheduler, 'bulk', BULK)
+    admitted = threading.Event()
+
+    def bulk() -> None:
+        with request_context('bulk', BULK), scheduler.slot():
+            admitted.set()
+
+    thread = start(bulk)
+    wait_until(lambda: scheduler.queued == {'bulk': 1})
+    assert not admitted.is_set()
+
+    with request_context('lookup', INTERACTIVE), scheduler.slot():
+        assert scheduler.in_flight == 2
+
+    holder.stop()
+    thread.join()
+    assert admitted.is_set()
+
+
+def test_requests_are_dropped_at_their_deadline():
+    scheduler = RequestScheduler(max_concurrency=1, reserved=0)
+    scheduler.metrics = Metrics()
+    holder = Holder(scheduler)
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceededException):
+        with request_context('lookup', NORMAL, timeout=0.1), scheduler.slot():
+            pass
+    assert 0.1 <= time.perf_counter() - started < 1.0
+    assert scheduler.queued == {}
+    assert scheduler.metrics.counter('directplus_scheduler_dropped_total') == 1
+
+    holder.stop()
+    assert scheduler.in_flight == 0
+
+
+def test_full_queue_refuses_requests_without_blocking():
+    scheduler = RequestScheduler(max_concurrency=1, reserved=0, queue_size=1, block=False)
+    holder = Holder(scheduler, 'job')
+
+    def queued_request() -> None:
+        with request_context('job'), scheduler.slot():
+            pass
+
+    waiter = start(queued_request)
+    wait_until(lambda: scheduler.queued == {'job': 1})
+    with pytest.raises(SchedulerQueueFullException):
+        with request_context('job'), scheduler.slot():
+            pass
+
+    holder.stop()
+    waiter.join()
+
+
+def test_full_queue_blocks_producers():
+    scheduler = RequestScheduler(max_concurrency=1, reserved=0, queue_size=1)
+    holder = Holder(scheduler, 'job')
+    admitted = []
+
+    def request(number: int) -> None:
+        with request_context('job'), scheduler.slot():
+            admitted.append(number)
+
+    first = start(request, 1)
+    wait_until(lambda: scheduler.queued == {'job': 1})
+    second = start(request, 2)
+    time.sleep(0.1)
+    # The second producer waits for room in the queue instead of queueing.
+    assert scheduler.queued == {'job': 1}
+    assert second.is_alive()
+
+    holder.stop()
+    first.join()
+    second.join()
+    assert admitted == [1, 2]
+
+
+@pytest.fixture
+def stub():
+    with StubServer(latency=0.2) as stub:
+        yield stub
+
+
+def test_interactive_request_does_not_wait_for_a_queued_duplicate(stub):
+    session_options = {'base_url': stub.url, 'cache': False, 'scheduler': {'max_concurrency': 2, 'reserved': 1}}
+    dp = DirectPlus(StubServer.CREDENTIALS, *StubServer.FLAGS, session_options=session_options)
+
+    def bulk(number: int) -> None:
+        with request_context('bulk', BULK):
+            dp.enrich_duns(f'{number:09d}', BLOCK_IDS)
+
+    threads = [start(bulk, number) for number in range(6)]
+    wait_until(lambda: sum(dp.request_scheduler.queued.values()) >= 4)
+
+    # The duns is queued by the bulk job, but the lookup is admitted through the reserved slot and sent itself.
+    started = time.perf_counter()
+    with request_context('lookup', INTERACTIVE, timeout=0.5):
+        result = dp.enrich_duns(f'{5:09d}', BLOCK_IDS)
+    assert time.perf_counter() - started < 0.5
+    assert result['organization']
+
+    for thread in threads:
+        thread.join()
+
+
+def test_waiting_for_a_duplicate_in_flight_ends_at_the_deadline(stub):
+    stub.latency = 1.0
+    dp = DirectPlus(StubServer.CREDENTIALS, *StubServer.FLAGS, session_options={'base_url': stub.url, 'cache': False})
+    leader = start(dp.enrich_duns, '000000001', BLOCK_IDS)
+    wait_until(lambda: len(dp.session.in_flight) == 1)
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceededException):
+        with request_context('lookup', INTERACTIVE, timeout=0.1):
+            dp.enrich_duns('000000001', BLOCK_IDS)
+    assert time.perf_counter() - started < 0.5
+    leader.join()
@@ -0,0 +1,57 @@
+import pytest
+
+from benchmarks.stub_server import StubServer
+from src.direct_plus import DirectPlus
+from src.tracing import TraceHook
+
+BLOCK_IDS = 'companyinfo_L2_v1'
+
+
+class RecordingHook(TraceHook):
+    def __init__(self):
+        self.ended = []
+
+    def on_end(self, trace) -> None:
+        self.ended.append([phase.name for phase in trace.phases])
+
+
+@pytest.fixture
+def stub():
+    with StubServer(latency=0) as stub:
+        yield stub
+
+
+@pytest.fixture
+def dp(stub):
+    return DirectPlus(StubServer.CREDENTIALS, *StubServer.FLAGS,
+                      session_options={'base_url': stub.url, 'cache': False})
+
+
+@pytest.fixture
+def hook(dp):
+    hook = RecordingHook()
+    dp.session.tracer.add_hook(hook)
+    return hook
+
+
+def test_trace_ends_after_the_body_is_decoded(dp, hook):
+    response = dp.call('dataBlocks', dunsNumber='000000001', blockIDs=BLOCK_IDS)
+    assert hook.ended == []
+
+    response.json()
+    assert hook.ended[0][-1] == 'json_decode'
+
+
+def test_tracing_does_not_decode_projected_responses(dp, hook):
+    result = dp.enrich_duns('000000001', BLOCK_IDS, fields=['organization.duns'])
+
+    assert result['organization.duns']
+    assert len(hook.ended) == 1
+    assert 'json_decode' not in hook.ended[0]
+
+
+def test_trace_ends_when_validation_fails(dp, hook):
+    with pytest.raises(ValueError):
+        dp.call('dataBlocks', dunsNumber=123, blockIDs=BLOCK_IDS)
+
+    assert hook.ended == [['validate']]